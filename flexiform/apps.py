@@ -3,6 +3,9 @@ from django.apps import AppConfig
 
 class FlexiFormConfig(AppConfig):
     name = 'flexiform'
+    # Read the lengths of repeating fields from the data when the structures
+    # are created. Disabled in the processes formatting export shards.
+    scan_repeating_fields = True
 
     def ready(self):
         from . import receivers  # noqa
@@ -12,5 +15,6 @@ class FlexiFormConfig(AppConfig):
         autodiscover()
 
         # 'Auto' spawn an instance of all registered structures.
-        from .json_structures import auto_spawn
+        from .json_structures import JsonStructure, auto_spawn
+        JsonStructure.scan_repeating_fields = self.scan_repeating_fields
         auto_spawn.start()
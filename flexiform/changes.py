@@ -0,0 +1,91 @@
+import collections
+import hashlib
+
+from django.db import connections, transaction
+from django.db.models import Max
+from django.db.models.functions import Cast
+
+from .conf import settings
+
+# The changes of a model between two cursors: the primary keys of the objects
+# created or updated and of the objects deleted (as querysets, to be used as
+# subqueries), and the cursor to continue from.
+Changes = collections.namedtuple('Changes', ['cursor', 'changed', 'deleted'])
+
+
+def is_tracked(model) -> bool:
+    """
+    Changes are recorded for models with a structure, if enabled with
+    FLEXIFORM_TRACK_CHANGES.
+    """
+    return settings.FLEXIFORM_TRACK_CHANGES and hasattr(
+        getattr(model, '_meta', None), 'structure')
+
+
+def _lock_changes(model: str, using: str=None) -> None:
+    """
+    Serialize the recording of the changes of a model until the end of the
+    transaction (with an advisory lock on PostgreSQL, other databases
+    serialize writes anyway). The IDs of the changes are then committed in
+    order: a cursor never passes a change which is not committed yet, and
+    concurrent changes of the same object do not conflict.
+    """
+    connection = connections[using or 'default']
+    if connection.vendor != 'postgresql':
+        return
+    key = int.from_bytes(hashlib.sha1(
+        f'flexiform.change:{model}'.encode()).digest()[:8], 'big', signed=True)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)', [key])
+
+
+def record_change(obj, deleted: bool=False, using: str=None) -> None:
+    """
+    Record the change of an object in the transaction saving it, so the change
+    is committed (or rolled back) along with the data. The lock on the changes
+    of the model is held until the end of the transaction, the cursors follow
+    the order in which the changes become visible. The previous change of the
+    object is replaced.
+    """
+    from .models import Change
+
+    model = obj._meta.label_lower
+    object_id = str(obj.pk)
+    changes = Change.objects.using(using)
+    with transaction.atomic(using=using):
+        _lock_changes(model, using=using)
+        changes.filter(model=model, object_id=object_id).delete()
+        changes.create(model=model, object_id=object_id, deleted=deleted)
+
+
+def get_cursor(model) -> int:
+    """
+    Return the current cursor of a model: the latest committed change. As
+    changes are recorded one after the other (see _lock_changes), all
+    changes up to the cursor are committed.
+    """
+    from .models import Change
+
+    return Change.objects.filter(
+        model=model._meta.label_lower).aggregate(cursor=Max('id'))['cursor'] or 0
+
+
+def get_changes(model, since: int, cursor: int=None) -> Changes:
+    """
+    Return the objects changed after the cursor "since", up to "cursor"
+    (defaults to the current cursor).
+    """
+    from .models import Change
+
+    if cursor is None:
+        cursor = get_cursor(model)
+    cursor = max(since, cursor)
+
+    object_ids = Change.objects.filter(
+        model=model._meta.label_lower, id__gt=since, id__lte=cursor
+    ).annotate(
+        object_pk=Cast('object_id', output_field=model._meta.pk)
+    ).values_list('object_pk', flat=True)
+    return Changes(
+        cursor=cursor, changed=object_ids.filter(deleted=False),
+        deleted=object_ids.filter(deleted=True))
@@ -1,3 +1,6 @@
+import os
+import tempfile
+
 from django.conf import settings
 from appconf import AppConf
 
@@ -6,3 +9,23 @@ class FlexiFormConf(AppConf):
     # Delimiter for form_keyword and fields in json-fields. Also used to put
     # properties to model.
     MODEL_JSON_PROPERTIES_DELIMITER = '_'
+
+    # Directory where the files of background exports are spooled.
+    EXPORT_ROOT = os.path.join(tempfile.gettempdir(), 'flexiform_exports')
+    # Maximum number of background exports running at the same time, shared
+    # by all processes using the same EXPORT_ROOT.
+    EXPORT_MAX_JOBS = 2
+    # Seconds after which finished background exports are removed.
+    EXPORT_JOB_MAX_AGE = 60 * 60 * 24
+
+    # Alias of the cache holding the data versions of the models. Must be
+    # shared by all processes.
+    CACHE = 'default'
+
+    # Seconds to keep rendered readonly forms in the FLEXIFORM_CACHE. Entries
+    # are replaced (by a new key) when the data version of the object changes.
+    FRAGMENT_TIMEOUT = 60 * 60 * 24
+
+    # Record the changes (saves and deletes) of models with a structure, to
+    # allow delta downloads (?since=<cursor>).
+    TRACK_CHANGES = False
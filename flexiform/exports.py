@@ -0,0 +1,436 @@
+import collections
+import datetime
+import hashlib
+import itertools
+import os
+import uuid
+import zipfile
+import zlib
+
+from django import forms
+from django.contrib.gis.geos import GEOSGeometry
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .conf import settings
+
+# The content of an export (an iterable of bytes), along with the name and
+# content type of the file.
+ExportFile = collections.namedtuple(
+    'ExportFile', ['chunks', 'filename', 'content_type'])
+
+# Types of the exported values, used for the columnar formats.
+STRING = 'string'
+INTEGER = 'integer'
+FLOAT = 'float'
+BOOLEAN = 'boolean'
+DATE = 'date'
+DATETIME = 'datetime'
+
+MODEL_FIELD_TYPES = {
+    'AutoField': INTEGER,
+    'BigAutoField': INTEGER,
+    'SmallAutoField': INTEGER,
+    'IntegerField': INTEGER,
+    'BigIntegerField': INTEGER,
+    'SmallIntegerField': INTEGER,
+    'PositiveIntegerField': INTEGER,
+    'PositiveSmallIntegerField': INTEGER,
+    'FloatField': FLOAT,
+    'BooleanField': BOOLEAN,
+    'NullBooleanField': BOOLEAN,
+    'DateField': DATE,
+    'DateTimeField': DATETIME,
+}
+
+
+def get_form_field_type(field) -> str:
+    """
+    Return the type of the values stored by a (JSON) form field.
+    """
+    # DecimalField and FloatField are subclasses of IntegerField. Decimals are
+    # exported as strings to keep their precision.
+    if isinstance(field, forms.DecimalField):
+        return STRING
+    if isinstance(field, forms.FloatField):
+        return FLOAT
+    if isinstance(field, forms.IntegerField):
+        return INTEGER
+    if isinstance(field, forms.BooleanField):
+        return BOOLEAN
+    if isinstance(field, forms.DateTimeField):
+        return DATETIME
+    if isinstance(field, forms.DateField):
+        return DATE
+    return STRING
+
+
+def get_model_field_type(field) -> str:
+    """
+    Return the type of the values of a model field. Foreign keys have the type
+    of the field they point to.
+    """
+    if field.is_relation and field.many_to_one:
+        field = field.target_field
+    return MODEL_FIELD_TYPES.get(field.get_internal_type(), STRING)
+
+
+def _to_string(value):
+    if isinstance(value, GEOSGeometry):
+        # For geometries, return value as well known text
+        return value.wkt
+    return str(value)
+
+
+def _to_boolean(value):
+    if isinstance(value, bool):
+        return value
+    return {'true': True, '1': True, 'false': False, '0': False}.get(
+        str(value).lower())
+
+
+def _to_date(value):
+    if isinstance(value, datetime.date):
+        return value
+    return parse_date(str(value))
+
+
+def _to_datetime(value):
+    if isinstance(value, datetime.datetime):
+        return value
+    return parse_datetime(str(value))
+
+
+CONVERTERS = {
+    STRING: _to_string,
+    INTEGER: int,
+    FLOAT: float,
+    BOOLEAN: _to_boolean,
+    DATE: _to_date,
+    DATETIME: _to_datetime,
+}
+
+
+def convert_value(value, value_type: str):
+    """
+    Convert a value to the given type. Empty values and values which cannot be
+    converted are returned as None.
+    """
+    if value in ('', None):
+        return None
+    try:
+        return CONVERTERS[value_type](value)
+    except (TypeError, ValueError):
+        return None
+
+
+# File extension and content type of the compressed files.
+COMPRESSIONS = {
+    'gzip': ('.gz', 'application/gzip'),
+    'zstd': ('.zst', 'application/zstd'),
+}
+
+
+def get_zstandard():
+    """
+    zstandard is an optional dependency, only needed for zstd compression.
+    """
+    try:
+        import zstandard
+    except ImportError:
+        raise ImproperlyConfigured(
+            'zstandard needs to be installed for zstd compression.')
+    return zstandard
+
+
+def iter_compressed(chunks, compression: str):
+    """
+    Yield the chunks (bytes) compressed with gzip or zstd. Each chunk is
+    passed to an incremental compressor, compressed bytes are yielded as soon
+    as the compressor returns them.
+    """
+    if compression == 'zstd':
+        compressor = get_zstandard().ZstdCompressor().compressobj()
+    else:
+        # wbits=31: zlib format with gzip header and trailer
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def get_pyarrow():
+    """
+    pyarrow is an optional dependency, only needed for the columnar formats.
+    """
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImproperlyConfigured(
+            'pyarrow needs to be installed for the Parquet and Arrow exports.')
+    return pyarrow
+
+
+def get_numpy():
+    """
+    NumPy is an optional dependency, only needed for the in-process columns.
+    """
+    try:
+        import numpy
+    except ImportError:
+        raise ImproperlyConfigured(
+            'numpy needs to be installed to export columns.')
+    return numpy
+
+
+def build_columns(header: list, value_types: list, rows,
+                  chunk_size: int) -> collections.OrderedDict:
+    """
+    Return the rows as columns: a dict with one NumPy array per column. The
+    rows are read in chunks of chunk_size, each chunk is converted to typed
+    arrays before the next rows are read.
+
+    Strings are object arrays (with None), floats use NaN and dates NaT for
+    empty values. Integers and booleans are masked arrays, the mask marking
+    the empty values.
+    """
+    np = get_numpy()
+    dtypes = {
+        STRING: object,
+        INTEGER: np.int64,
+        FLOAT: np.float64,
+        BOOLEAN: np.bool_,
+        DATE: 'datetime64[D]',
+        DATETIME: 'datetime64[us]',
+    }
+    masked_types = (INTEGER, BOOLEAN)
+
+    chunks = [[] for _ in header]
+    masks = [[] for _ in header]
+    rows = iter(rows)
+    while True:
+        chunk_rows = list(itertools.islice(rows, chunk_size))
+        if not chunk_rows:
+            break
+        for i, (column, value_type) in enumerate(
+                zip(zip(*chunk_rows), value_types)):
+            values = [convert_value(value, value_type) for value in column]
+            if value_type in masked_types:
+                masks[i].append(np.array([v is None for v in values]))
+                values = [0 if v is None else v for v in values]
+            elif value_type == FLOAT:
+                values = [np.nan if v is None else v for v in values]
+            elif value_type == DATETIME:
+                # NumPy has no timezones, use UTC
+                values = [
+                    timezone.make_naive(v, timezone.utc)
+                    if v is not None and timezone.is_aware(v) else v
+                    for v in values]
+            chunks[i].append(np.array(values, dtype=dtypes[value_type]))
+
+    columns = collections.OrderedDict()
+    for i, (name, value_type) in enumerate(zip(header, value_types)):
+        values = np.concatenate(
+            chunks[i] or [np.array([], dtype=dtypes[value_type])])
+        if value_type in masked_types:
+            mask = np.concatenate(masks[i] or [np.array([], dtype=bool)])
+            values = np.ma.MaskedArray(values, mask=mask)
+        columns[name] = values
+    return columns
+
+
+def columns_to_dataframe(columns: collections.OrderedDict):
+    """
+    Return the columns (as returned by build_columns) as pandas DataFrame.
+    Masked arrays are converted to pandas' nullable integer and boolean
+    arrays.
+    """
+    try:
+        import pandas
+    except ImportError:
+        raise ImproperlyConfigured(
+            'pandas needs to be installed to export a DataFrame.')
+
+    data = collections.OrderedDict()
+    for name, values in columns.items():
+        if isinstance(values, get_numpy().ma.MaskedArray):
+            mask = get_numpy().ma.getmaskarray(values)
+            if values.dtype == bool:
+                values = pandas.arrays.BooleanArray(values.data, mask)
+            else:
+                values = pandas.arrays.IntegerArray(values.data, mask)
+        data[name] = values
+    return pandas.DataFrame(data, columns=list(columns.keys()))
+
+
+def iter_columnar(header: list, value_types: list, rows, file_format: str,
+                  batch_size: int):
+    """
+    Yield the bytes of a Parquet file or an Arrow IPC stream of the rows. Rows
+    are converted to record batches of batch_size rows, each batch is written
+    before the next rows are read.
+
+    :param header: list. The column names.
+    :param value_types: list. The type of each column (e.g. INTEGER).
+    :param rows: An iterable of rows (lists of values).
+    :param file_format: str. Either 'parquet' or 'arrow'.
+    :param batch_size: int. The number of rows per record batch.
+    """
+    pa = get_pyarrow()
+    arrow_types = {
+        STRING: pa.string(),
+        INTEGER: pa.int64(),
+        FLOAT: pa.float64(),
+        BOOLEAN: pa.bool_(),
+        DATE: pa.date32(),
+        DATETIME: pa.timestamp('us'),
+    }
+    schema = pa.schema([
+        (name, arrow_types[value_type])
+        for name, value_type in zip(header, value_types)])
+
+    buffer = WriteBuffer()
+    sink = pa.PythonFile(buffer, mode='w')
+    if file_format == 'parquet':
+        import pyarrow.parquet
+        writer = pyarrow.parquet.ParquetWriter(sink, schema)
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+
+    rows = iter(rows)
+    while True:
+        batch_rows = list(itertools.islice(rows, batch_size))
+        if not batch_rows:
+            break
+        arrays = [
+            pa.array(
+                [convert_value(value, value_type) for value in column],
+                type=arrow_types[value_type])
+            for column, value_type in zip(zip(*batch_rows), value_types)
+        ]
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+        data = buffer.pop()
+        if data:
+            yield data
+
+    writer.close()
+    yield buffer.pop()
+
+
+class WriteBuffer:
+    """
+    An unseekable file-like object collecting the bytes written to it until
+    they are taken out with pop().
+    """
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def pop(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class ZipStream:
+    """
+    Create a ZIP archive as a stream of bytes, without knowing the size of the
+    files in advance. Files are added one after the other, the compressed
+    bytes are yielded as soon as they are available.
+
+    Usage:
+    zip_stream = ZipStream()
+    yield from zip_stream.write_file('a.csv', chunks_a)
+    yield from zip_stream.write_file('b.csv', chunks_b)
+    yield from zip_stream.close()
+    """
+    def __init__(self, compression: int=zipfile.ZIP_DEFLATED):
+        self.buffer = WriteBuffer()
+        self.zip_file = zipfile.ZipFile(
+            self.buffer, mode='w', compression=compression)
+
+    def write_file(self, filename: str, chunks):
+        """
+        Add a file with the given content (an iterable of bytes) to the
+        archive.
+        """
+        with self.zip_file.open(filename, mode='w', force_zip64=True) as f:
+            for chunk in chunks:
+                f.write(chunk)
+                data = self.buffer.pop()
+                if data:
+                    yield data
+        yield self.buffer.pop()
+
+    def close(self):
+        """
+        Write the central directory, which ends the archive.
+        """
+        self.zip_file.close()
+        yield self.buffer.pop()
+
+
+class CachedExport:
+    """
+    An export spooled to a file in FLEXIFORM_EXPORT_ROOT, identified by key
+    parts (e.g. model, format and filters) and the data version. Only the file
+    of the latest version is kept per key.
+    """
+
+    def __init__(self, key_parts: list, version: str, filename: str):
+        key = hashlib.sha1(repr(key_parts).encode()).hexdigest()
+        self.directory = os.path.join(
+            settings.FLEXIFORM_EXPORT_ROOT, 'cache', key)
+        self.path = os.path.join(
+            self.directory, f'{version}-{os.path.basename(filename)}')
+
+    def exists(self) -> bool:
+        return os.path.isfile(self.path)
+
+    def write(self, chunks):
+        """
+        Yield the chunks while writing them to the file. The file is only
+        stored once all chunks are written, an interrupted export is
+        discarded.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = f'{self.path}.{uuid.uuid4().hex}.part'
+        try:
+            with open(temp_path, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+            os.replace(temp_path, self.path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        self.remove_outdated()
+
+    def remove_outdated(self) -> None:
+        """
+        Remove the files of older versions.
+        """
+        for filename in os.listdir(self.directory):
+            path = os.path.join(self.directory, filename)
+            if path != self.path and not filename.endswith('.part'):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
@@ -1,12 +1,15 @@
 import collections
 
 from django import forms
+from django.core.exceptions import FieldDoesNotExist
+from django.db import transaction
 from django.forms import BaseFormSet
 from django.template.loader import render_to_string
 from django.utils.module_loading import import_string
 
 from .fields import (JsonMixin, JsonMultiRowField, JsonStruct, LinkRowField,
                      ThroughRowField)
+from .fragments import render_cached
 from .validators import validate_no_underscore
 
 RepeatingRowField = collections.namedtuple(
@@ -39,6 +42,16 @@ class LinkModelField:
         self.options = options
 
 
+def get_promoted_value(model_field, value):
+    """
+    Return a JSON value as value of the model field it is promoted to. Empty
+    values are stored as NULL or the default of the field.
+    """
+    if value in ('', None, []):
+        return None if model_field.null else model_field.get_default()
+    return model_field.to_python(value)
+
+
 class ChainDict(dict):
     """
     Helper to access dynamic key paths
@@ -62,6 +75,8 @@ class NetworkFormMixin:
 
 
 class ReadOnlyMixin:
+    # Set by the detail view to keep the rendered form in the cache.
+    render_cache_key = None
 
     def __init__(self, *args, **kwargs):
         self.readonly = kwargs.pop('readonly', False)
@@ -109,6 +124,15 @@ class BaseForm(ReadOnlyMixin, forms.ModelForm):
     def has_repeating_fields(self):
         return hasattr(self.Meta, 'repeating_fields')
 
+    @property
+    def promoted_fields(self) -> dict:
+        """
+        JSON fields which are also stored in a model field (Meta option
+        promoted_fields: {<json field name>: <model field name>}), e.g. to
+        filter or chart them with an index.
+        """
+        return getattr(self.Meta, 'promoted_fields', {})
+
     @property
     def has_through_fields(self):
         return hasattr(self.Meta, 'through_fields')
@@ -199,10 +223,10 @@ class BaseForm(ReadOnlyMixin, forms.ModelForm):
 
     @property
     def render(self) -> str:
-        return render_to_string(
+        return render_cached(self.render_cache_key, lambda: render_to_string(
             template_name=self.template_name,
             context=self.get_context(),
-        )
+        ))
 
     def to_model(self, data: dict) -> tuple:
         """
@@ -223,9 +247,14 @@ class BaseForm(ReadOnlyMixin, forms.ModelForm):
         json_fields = []
         for name, field, is_json in self.model_fields():
             if is_json:
-                json_fields.append(
-                    field.to_json(keyword=self.Meta.keyword, key=name, value=data[name])
-                )
+                json_field = field.to_json(
+                    keyword=self.Meta.keyword, key=name, value=data[name])
+                json_fields.append(json_field)
+                if name in self.promoted_fields:
+                    column = self.promoted_fields[name]
+                    fields[column] = get_promoted_value(
+                        self.Meta.model._meta.get_field(column),
+                        json_field.value)
             else:
                 fields[name] = data[name]
 
@@ -280,7 +309,7 @@ class BaseForm(ReadOnlyMixin, forms.ModelForm):
                 m2m = cls._get_through_relation(instance, field)
 
                 field_data = []
-                for obj in m2m.through_query:
+                for obj in cls._get_through_objects(instance, field, m2m):
                     for key in field.row.keys():
                         if key == 'to_id':
                             field_data.append(
@@ -303,6 +332,10 @@ class BaseForm(ReadOnlyMixin, forms.ModelForm):
                     else:
                         field_data = []
 
+                elif field.name in getattr(
+                        instance, '_prefetched_objects_cache', {}):
+                    related_manager = getattr(instance, field.name)
+                    field_data = [obj.id for obj in related_manager.all()]
                 else:
                     related_manager = getattr(instance, field.name)
                     field_data = related_manager.values_list('id', flat=True)
@@ -311,6 +344,42 @@ class BaseForm(ReadOnlyMixin, forms.ModelForm):
 
         return fields
 
+    @classmethod
+    def get_related_lookups(cls) -> tuple:
+        """
+        Return the relations of the model read by from_model, to fetch them
+        along with the instance.
+
+        :return: tuple. The lookups for (1) select_related and (2)
+            prefetch_related.
+        """
+        model = cls.Meta.model
+        select_related = []
+        prefetch_related = []
+        for name, field, is_json in cls.model_fields():
+            if is_json:
+                continue
+            try:
+                model_field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if model_field.concrete and (
+                    model_field.many_to_one or model_field.one_to_one):
+                select_related.append(name)
+
+        for field in getattr(cls.Meta, 'link_fields', []):
+            if field.is_foreign_key is True:
+                select_related.append(field.name)
+            else:
+                prefetch_related.append(field.name)
+
+        for field in getattr(cls.Meta, 'through_fields', []):
+            accessor = cls._get_through_accessor(model, field)
+            if accessor:
+                prefetch_related.append(accessor)
+
+        return select_related, prefetch_related
+
     @classmethod
     def model_fields(cls):
         fields = {
@@ -322,28 +391,34 @@ class BaseForm(ReadOnlyMixin, forms.ModelForm):
                 yield name, field, isinstance(field, JsonMixin)
 
     def save(self, object_id=None):
-        fields, json_fields = self.to_model(data=self.cleaned_data)
-        # Create or update model with its own attributes
-        obj, _ = self.Meta.model.objects.update_or_create(
-            pk=object_id, defaults=fields
-        )
-
-        # Write all json fields to the `data` column
-        for field in json_fields:
-            obj.data = self._update_data_dict(obj.data or {}, field)
-
-        obj.save()
-
-        if self.has_through_fields:
-            for field in self.Meta.through_fields:
-                data_list = self.fields[field.name].to_model(
-                    data_list=self.cleaned_data.get(field.name, []))
-                self.save_through(obj, field, data_list)
-
-        if self.has_link_fields:
-            for field in self.Meta.link_fields:
-                self.save_link(
-                    obj, field, self.cleaned_data.get(field.name, []))
+        """
+        Save the object along with its through objects and links in one
+        transaction: the data version of the object changes once all of them
+        are committed (see receivers.update_model_version).
+        """
+        with transaction.atomic():
+            fields, json_fields = self.to_model(data=self.cleaned_data)
+            # Create or update model with its own attributes
+            obj, _ = self.Meta.model.objects.update_or_create(
+                pk=object_id, defaults=fields
+            )
+
+            # Write all json fields to the `data` column
+            for field in json_fields:
+                obj.data = self._update_data_dict(obj.data or {}, field)
+
+            obj.save()
+
+            if self.has_through_fields:
+                for field in self.Meta.through_fields:
+                    data_list = self.fields[field.name].to_model(
+                        data_list=self.cleaned_data.get(field.name, []))
+                    self.save_through(obj, field, data_list)
+
+            if self.has_link_fields:
+                for field in self.Meta.link_fields:
+                    self.save_link(
+                        obj, field, self.cleaned_data.get(field.name, []))
 
         return obj
 
@@ -405,12 +480,45 @@ class BaseForm(ReadOnlyMixin, forms.ModelForm):
         obj.save()
 
     @staticmethod
-    def _get_through_relation(obj, field: ThroughModelField) -> ThroughRelation:
+    def _get_m2m_field(model, field: ThroughModelField):
         # Find the right many2many relation
         m2m_field = None
-        for rel in obj._meta.many_to_many:
+        for rel in model._meta.many_to_many:
             if rel.related_model == field.to_model:
                 m2m_field = rel
+        return m2m_field
+
+    @classmethod
+    def _get_through_accessor(cls, model, field: ThroughModelField) -> str:
+        """
+        Return the name of the reverse relation from the model to its through
+        objects, or None if the relation is hidden.
+        """
+        m2m_field = cls._get_m2m_field(model, field)
+        if m2m_field is None:
+            return None
+        through = m2m_field.remote_field.through
+        from_field = through._meta.get_field(m2m_field.m2m_field_name())
+        if from_field.remote_field.is_hidden():
+            return None
+        return from_field.remote_field.get_accessor_name()
+
+    @classmethod
+    def _get_through_objects(cls, instance, field: ThroughModelField,
+                             m2m: ThroughRelation):
+        """
+        Return the through objects of the instance: the same objects as the
+        through_query, but prefetched objects are used if available.
+        """
+        accessor = cls._get_through_accessor(type(instance), field)
+        if accessor is None:
+            return m2m.through_query
+        return getattr(instance, accessor).all()
+
+    @classmethod
+    def _get_through_relation(cls, obj,
+                              field: ThroughModelField) -> ThroughRelation:
+        m2m_field = cls._get_m2m_field(obj._meta.model, field)
         m2m_manager = getattr(obj, m2m_field.name)
         from_field = m2m_field.m2m_field_name()
         through_filter = {
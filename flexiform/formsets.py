@@ -1,6 +1,8 @@
 from django.forms import formsets, modelformset_factory
 from django.template.loader import render_to_string
 
+from .fragments import render_cached
+
 
 class BaseFlexiFormSet(formsets.BaseFormSet):
     """
@@ -9,6 +11,8 @@ class BaseFlexiFormSet(formsets.BaseFormSet):
     #todo: discuss option to provide custom template_name
     """
     template_name = 'flexiform/formset/base.html'
+    # Set by the detail view to keep the rendered formset in the cache.
+    render_cache_key = None
 
     def get_context(self):
         return {
@@ -17,10 +21,10 @@ class BaseFlexiFormSet(formsets.BaseFormSet):
         }
 
     def as_table(self):
-        return render_to_string(
+        return render_cached(self.render_cache_key, lambda: render_to_string(
             template_name=self.template_name,
             context=self.get_context(),
-        )
+        ))
 
     def save(self, object_id):
         for form in self.forms:
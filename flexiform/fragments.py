@@ -0,0 +1,30 @@
+import hashlib
+
+from django.core.cache import caches
+from django.utils.safestring import mark_safe
+
+from .conf import settings
+
+
+def get_fragment_key(key_parts: list) -> str:
+    """
+    Return the cache key of a rendered fragment, identified by key parts
+    (e.g. object, data version, section and language).
+    """
+    key = hashlib.sha1(repr(key_parts).encode()).hexdigest()
+    return f'flexiform:fragment:{key}'
+
+
+def render_cached(cache_key: str or None, render) -> str:
+    """
+    Return the fragment from the FLEXIFORM_CACHE, or render it (by calling
+    render) and store it. Without cache_key, the fragment is always rendered.
+    """
+    if cache_key is None:
+        return render()
+    cache = caches[settings.FLEXIFORM_CACHE]
+    html = cache.get(cache_key)
+    if html is None:
+        html = render()
+        cache.set(cache_key, str(html), settings.FLEXIFORM_FRAGMENT_TIMEOUT)
+    return mark_safe(html)
@@ -0,0 +1,270 @@
+import concurrent.futures
+import contextlib
+import fcntl
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import time
+import uuid
+
+import django
+from django.db import connections
+
+from .conf import settings
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class ExportJob:
+    """
+    An export running in the background. The file and its status (as JSON) are
+    spooled to a directory per job in FLEXIFORM_EXPORT_ROOT.
+
+    The process running the job keeps a lock on the job's lock file until the
+    job is finished. A queued or running job without lock was interrupted
+    (e.g. its process was restarted) and is reported as failed.
+    """
+    status_filename = 'status.json'
+    lock_filename = 'job.lock'
+    lock_file = None
+
+    def __init__(self, job_id: str):
+        self.id = job_id
+        self.directory = os.path.join(jobs_root(), job_id)
+
+    @classmethod
+    def create(cls, filename: str, content_type: str, owner=None):
+        job = cls(uuid.uuid4().hex)
+        os.makedirs(job.directory)
+        job.lock_file = open(job.lock_path, 'w')
+        fcntl.flock(job.lock_file, fcntl.LOCK_EX)
+        job.set_status(
+            status=QUEUED, filename=os.path.basename(filename),
+            content_type=content_type, owner=owner, size=None, error=None,
+            created=time.time())
+        return job
+
+    @property
+    def status_path(self) -> str:
+        return os.path.join(self.directory, self.status_filename)
+
+    @property
+    def lock_path(self) -> str:
+        return os.path.join(self.directory, self.lock_filename)
+
+    def get_status(self) -> dict or None:
+        """
+        Return the status of the job, None if the job does not exist.
+        Interrupted jobs are marked as failed.
+        """
+        status = self._read_status()
+        if status and status['status'] in (QUEUED, RUNNING) and \
+                not self.is_alive():
+            # Read the status again: the job may have finished meanwhile.
+            status = self._read_status()
+            if status['status'] in (QUEUED, RUNNING):
+                self.set_status(
+                    status=FAILED, error='The export was interrupted.')
+                status = self._read_status()
+        return status
+
+    def _read_status(self) -> dict or None:
+        try:
+            with open(self.status_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def is_alive(self) -> bool:
+        """
+        Whether a process holds the lock of the job.
+        """
+        try:
+            f = open(self.lock_path, 'a')
+        except FileNotFoundError:
+            return False
+        with f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return True
+            fcntl.flock(f, fcntl.LOCK_UN)
+            return False
+
+    def release(self) -> None:
+        """
+        Release the lock of the job, once it is finished.
+        """
+        if self.lock_file is not None:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+            self.lock_file.close()
+            self.lock_file = None
+
+    def set_status(self, **values) -> None:
+        status = self._read_status() or {}
+        status.update(values)
+        # Replace the file at once, so no incomplete status is ever read.
+        temp_path = f'{self.status_path}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(status, f)
+        os.replace(temp_path, self.status_path)
+
+    @property
+    def file_path(self) -> str:
+        return os.path.join(self.directory, self.get_status()['filename'])
+
+    def run(self, chunks) -> None:
+        """
+        Write the chunks (bytes) to the file of the job. The file is only
+        available under its name once complete.
+        """
+        self.set_status(status=RUNNING)
+        file_path = self.file_path
+        temp_path = f'{file_path}.part'
+        try:
+            with open(temp_path, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            os.replace(temp_path, file_path)
+        except Exception as e:
+            logger.exception(f'Export job {self.id} failed')
+            self.set_status(status=FAILED, error=str(e))
+        else:
+            self.set_status(status=DONE, size=os.path.getsize(file_path))
+        finally:
+            self.release()
+
+
+def jobs_root() -> str:
+    return os.path.join(settings.FLEXIFORM_EXPORT_ROOT, 'jobs')
+
+
+class ExportJobRunner:
+    """
+    Run exports in a thread pool of the current process. The number of exports
+    running at once is limited to FLEXIFORM_EXPORT_MAX_JOBS for all processes
+    sharing the same FLEXIFORM_EXPORT_ROOT: each running job holds a lock on
+    one of the slot files.
+    """
+    executor = None
+
+    def enqueue(self, chunks, filename: str, content_type: str,
+                owner=None) -> ExportJob:
+        """
+        Create a job writing the chunks (an iterable of bytes) to a file and
+        queue it.
+        """
+        self.remove_expired()
+        job = ExportJob.create(
+            filename=filename, content_type=content_type, owner=owner)
+        self.get_executor().submit(self._run, job, chunks)
+        return job
+
+    def get_executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        if self.executor is None:
+            self.executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=settings.FLEXIFORM_EXPORT_MAX_JOBS)
+        return self.executor
+
+    def _run(self, job: ExportJob, chunks) -> None:
+        try:
+            with self.slot():
+                job.run(chunks)
+        finally:
+            job.release()
+            # Database connections are per thread, close the ones opened by
+            # the export.
+            connections.close_all()
+
+    @contextlib.contextmanager
+    def slot(self, poll_interval: int=1):
+        """
+        Wait until one of the slots is free and keep it locked while running.
+        """
+        root = settings.FLEXIFORM_EXPORT_ROOT
+        os.makedirs(root, exist_ok=True)
+        while True:
+            for i in range(settings.FLEXIFORM_EXPORT_MAX_JOBS):
+                f = open(os.path.join(root, f'slot-{i}.lock'), 'w')
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    f.close()
+                    continue
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+                    f.close()
+                return
+            time.sleep(poll_interval)
+
+    @staticmethod
+    def remove_expired() -> None:
+        """
+        Remove the directories of jobs older than FLEXIFORM_EXPORT_JOB_MAX_AGE,
+        which are finished or were interrupted (get_status marks these as
+        failed).
+        """
+        root = jobs_root()
+        if not os.path.isdir(root):
+            return
+        max_created = time.time() - settings.FLEXIFORM_EXPORT_JOB_MAX_AGE
+        for job_id in os.listdir(root):
+            status = ExportJob(job_id).get_status()
+            if status and status['created'] < max_created and \
+                    status['status'] in (DONE, FAILED):
+                shutil.rmtree(os.path.join(root, job_id), ignore_errors=True)
+
+
+export_jobs = ExportJobRunner()
+
+
+def setup_shard_process() -> None:
+    """
+    Set up Django in a process of the shard pool. The structures are created
+    without reading the lengths of repeating fields from the data (a scan of
+    each table): the shards are exported with the column definitions of the
+    requesting process.
+    """
+    from .apps import FlexiFormConfig
+    FlexiFormConfig.scan_repeating_fields = False
+    django.setup()
+
+
+class ShardPool:
+    """
+    Pools of processes formatting the shards of exports, kept for the lifetime
+    of the process and shared by all its requests (one pool per size). The
+    processes are spawned (not forked, as the web server's process may run
+    other threads holding locks), they set up Django from the
+    DJANGO_SETTINGS_MODULE environment variable.
+    """
+    def __init__(self):
+        self.executors = {}
+        self.pid = None
+
+    def get_executor(
+            self, max_workers: int) -> concurrent.futures.ProcessPoolExecutor:
+        if self.pid != os.getpid():
+            # Pools are not inherited by forked processes.
+            self.executors = {}
+            self.pid = os.getpid()
+        executor = self.executors.get(max_workers)
+        if executor is None:
+            executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=setup_shard_process)
+            self.executors[max_workers] = executor
+        return executor
+
+
+shard_pool = ShardPool()
@@ -1,11 +1,47 @@
 import collections
+import operator
+
+from django.contrib.postgres.fields.jsonb import KeyTextTransform, KeyTransform
+from django.core.exceptions import ValidationError
 from django.db import ProgrammingError
+from django.db.models import F
+from django.utils import translation
 
 from .conf import settings
-from .fields import JsonCharField
-from .forms import BaseForm
+from .exports import (build_columns, columns_to_dataframe, get_form_field_type,
+                      get_model_field_type)
+from .fields import JsonCharField, JsonMixin
+from .forms import BaseForm, get_promoted_value
 from .validators import validate_no_underscore
 
+# Definition of a model property: the form field with the keyword and name
+# it is stored at. For repeating fields, row_key and index point to the value
+# within the list of rows.
+StructureProperty = collections.namedtuple(
+    'StructureProperty',
+    ['name', 'keyword', 'field_name', 'field', 'row_key', 'index']
+)
+
+def get_key_text_transform(path: list, field_name: str='data'):
+    """
+    Return the expression extracting the value at a path of a JSON field as
+    text, e.g. data->'Section'->>'question'.
+    """
+    expression = field_name
+    for key in path[:-1]:
+        expression = KeyTransform(key, expression)
+    return KeyTextTransform(path[-1], expression)
+
+
+# An option of a selection field: the labels of the section, the question and
+# the option, along with the code (the stored value). For repeating fields,
+# row_key is the key of the field within the row.
+CodebookEntry = collections.namedtuple(
+    'CodebookEntry',
+    ['section', 'question', 'option', 'code', 'keyword', 'field_name',
+     'row_key']
+)
+
 
 class JsonStructure:
     """
@@ -15,12 +51,20 @@ class JsonStructure:
     - a single underscore is reserved for the property name, so use CamelCase
       for form keywords and field names.
     """
+    # Without scanning, repeating fields have no properties until
+    # update_properties is called (see FlexiFormConfig).
+    scan_repeating_fields = True
 
     def __init__(self, model_class):
         # setup instance variables
         self.model_class = model_class
         self.properties = []
+        self.property_definitions = []
         self.forms = collections.OrderedDict()
+        # Codebooks and choice labels by language, they only depend on the
+        # (class-level) form definitions.
+        self.codebooks = {}
+        self.choice_labels = {}
         self.set_forms()
         self.prepare_properties()
 
@@ -44,6 +88,7 @@ class JsonStructure:
         """
         # Remove old properties first
         self.properties = []
+        self.property_definitions = []
         for keyword, form in self.forms.items():
             self._prepare_json_properties(keyword=keyword, form=form)
             self._prepare_repeating_fields_properties(keyword=keyword, form=form)
@@ -74,6 +119,9 @@ class JsonStructure:
             return ''
 
         self.properties.append(property_name)
+        self.property_definitions.append(StructureProperty(
+            name=property_name, keyword=keyword, field_name=name, field=field,
+            row_key=None, index=None))
         setattr(
             self.model_class,
             property_name,
@@ -107,6 +155,8 @@ class JsonStructure:
         """
         Generator for list-lengths of given field_path
         """
+        if not self.scan_repeating_fields:
+            return
         try:
             rows = self.model_class.objects.exclude(data__isnull=True).only('data')
             for row in rows:
@@ -137,12 +187,305 @@ class JsonStructure:
                 return ''
 
         self.properties.append(property_name)
+        self.property_definitions.append(StructureProperty(
+            name=property_name, keyword=keyword, field_name=field.name,
+            field=field, row_key=row_index, index=i))
         setattr(
             self.model_class,
             property_name,
             property(property_fn)
         )
 
+    def get_repeating_fields(self):
+        """
+        Return all repeating fields along with the keyword of their form.
+        """
+        for keyword, form in self.forms.items():
+            for field in getattr(form.Meta, 'repeating_fields', []):
+                yield keyword, field
+
+    @staticmethod
+    def get_definition_keys(definitions: list) -> list:
+        """
+        Return the property definitions as plain tuples (without the form
+        fields), e.g. to pass them to another process.
+        """
+        return [(d.name, d.keyword, d.field_name, d.row_key, d.index)
+                for d in definitions]
+
+    def get_definitions(self, keys: list) -> list:
+        """
+        Return the property definitions of keys as returned by
+        get_definition_keys, with the form fields of this structure. The
+        properties do not need to be set on the model (e.g. repeating fields
+        of other lengths).
+        """
+        fields = {(d.keyword, d.field_name): d.field
+                  for d in self.property_definitions if d.index is None}
+        fields.update({(keyword, field.name): field
+                       for keyword, field in self.get_repeating_fields()})
+        return [
+            StructureProperty(
+                name=name, keyword=keyword, field_name=field_name,
+                field=fields[(keyword, field_name)], row_key=row_key,
+                index=index)
+            for name, keyword, field_name, row_key, index in keys
+        ]
+
+    @staticmethod
+    def get_form_field(definition: StructureProperty):
+        """
+        Return the form field of a property. For repeating fields, this is the
+        field of the row.
+        """
+        if definition.index is not None:
+            return definition.field.row[definition.row_key][0]
+        return definition.field
+
+    def get_property_types(self) -> list:
+        """
+        Return the type of the values of each property (e.g. 'integer'), based
+        on its form field.
+        """
+        return [
+            get_form_field_type(self.get_form_field(definition))
+            for definition in self.property_definitions
+        ]
+
+    def to_columns(self, queryset=None, model_fields: list=(),
+                   chunk_size: int=2000) -> collections.OrderedDict:
+        """
+        Return the model fields and properties of all objects as columns, with
+        one typed NumPy array per column (see exports.build_columns). The
+        objects are read from the database in chunks, no model instances are
+        created. Requires numpy.
+
+        Usage (e.g. in a management command):
+        columns = Actor._meta.structure.to_columns(
+            queryset=Actor.objects.filter(topic='foo'), model_fields=['id'])
+
+        :param queryset: The objects to export, defaults to all objects.
+        :param model_fields: list. Names of model fields added as first
+            columns.
+        :param chunk_size: int. The number of objects read at once.
+        """
+        if queryset is None:
+            queryset = self.model_class.objects.all()
+
+        value_types = [
+            get_model_field_type(queryset.model._meta.get_field(field_name))
+            for field_name in model_fields
+        ] + self.get_property_types()
+
+        extract = self.get_row_extractor()
+        values_list = queryset.values_list(*model_fields, 'data')
+        rows = (
+            list(row[:-1]) + extract(row[-1])
+            for row in values_list.iterator(chunk_size=chunk_size))
+
+        return build_columns(
+            header=list(model_fields) + self.properties,
+            value_types=value_types, rows=rows, chunk_size=chunk_size)
+
+    def to_dataframe(self, queryset=None, model_fields: list=(),
+                     chunk_size: int=2000):
+        """
+        Return the same columns as to_columns as pandas DataFrame. Requires
+        numpy and pandas.
+        """
+        return columns_to_dataframe(self.to_columns(
+            queryset=queryset, model_fields=model_fields,
+            chunk_size=chunk_size))
+
+    def get_row_extractor(self, definitions: list=None):
+        """
+        Compile the properties into a single function, returning the values of
+        all properties for a data dict (as stored in the model's "data" field).
+        The values are the same as returned by the model properties, but the
+        section of each property is looked up only once per row.
+
+        :param definitions: list. Only extract these properties, defaults to
+            all property_definitions.
+        """
+        if definitions is None:
+            definitions = self.property_definitions
+        sections = []
+        for definition in definitions:
+            if not sections or sections[-1][0] != definition.keyword:
+                sections.append((definition.keyword, []))
+            sections[-1][1].append(self._get_value_getter(definition))
+
+        empty_row = [''] * len(definitions)
+
+        def extract(data: dict) -> list:
+            if not data:
+                return list(empty_row)
+            row = []
+            for keyword, getters in sections:
+                section_data = data.get(keyword, {})
+                row.extend([getter(section_data) for getter in getters])
+            return row
+
+        return extract
+
+    def get_property_expressions(
+            self, definitions: list=None) -> collections.OrderedDict:
+        """
+        Return one SQL expression per property, extracting the value as text
+        from the "data" field in the database, e.g.
+        data->'Section'->>'question' or data#>>'{Section,group,0,key}'.
+
+        Values are returned as the database represents them as text (e.g.
+        'true' for booleans), custom from_json methods are not applied.
+        """
+        if definitions is None:
+            definitions = self.property_definitions
+        expressions = collections.OrderedDict()
+        for definition in definitions:
+            path = [definition.keyword, definition.field_name]
+            if definition.index is not None:
+                path.extend([str(definition.index), definition.row_key])
+            column = self.get_promoted_fields().get(
+                (definition.keyword, definition.field_name))
+            if column and definition.index is None:
+                # Read the promoted column instead
+                expressions[definition.name] = F(column)
+                continue
+            expressions[definition.name] = get_key_text_transform(path)
+        return expressions
+
+    def values_list(self, queryset, *fields, definitions: list=None):
+        """
+        Return the queryset as flat rows: the given model fields followed by
+        the values of all properties, extracted by the database.
+        """
+        expressions = self.get_property_expressions(definitions)
+        return queryset.annotate(**expressions).values_list(
+            *fields, *expressions.keys())
+
+    def get_promoted_fields(self) -> dict:
+        """
+        Return the model fields of the promoted JSON fields (see
+        BaseForm.promoted_fields) as dict {(keyword, field name): model field
+        name}.
+        """
+        return {
+            (keyword, name): column
+            for keyword, form in self.forms.items()
+            for name, column in getattr(form.Meta, 'promoted_fields', {}).items()
+        }
+
+    def get_lookup(self, keyword: str, name: str) -> str:
+        """
+        Return the lookup of a JSON field: the promoted model field if there is
+        one, else the path in the data.
+        """
+        return self.get_promoted_fields().get(
+            (keyword, name), f'data__{keyword}__{name}')
+
+    def get_promoted_values(self, data: dict) -> dict:
+        """
+        Return the values of the promoted model fields from the data of an
+        object, e.g. to fill newly promoted fields.
+        """
+        values = {}
+        for (keyword, name), column in self.get_promoted_fields().items():
+            values[column] = get_promoted_value(
+                self.model_class._meta.get_field(column),
+                (data or {}).get(keyword, {}).get(name))
+        return values
+
+    def get_promoted_code(self, keyword: str, name: str, code):
+        """
+        Return a code of a selection field as it is read from its promoted
+        model field (e.g. 3 for '3' in an IntegerField), or unchanged if the
+        field is not promoted or the code is not a valid value of the model
+        field.
+        """
+        column = self.get_promoted_fields().get((keyword, name))
+        if column is None:
+            return code
+        try:
+            return get_promoted_value(
+                self.model_class._meta.get_field(column), code)
+        except ValidationError:
+            return code
+
+    def get_codebook(self, language: str=None) -> list:
+        """
+        Return the options of all selection fields (including the fields of
+        repeating rows) as CodebookEntry, with the labels in the given
+        language (defaults to the active language). The codebook is built
+        from the fields of the form classes, without instantiating the forms,
+        and kept for each language.
+        """
+        language = language or translation.get_language()
+        if language not in self.codebooks:
+            with translation.override(language):
+                self.codebooks[language] = list(self._iter_codebook())
+        return self.codebooks[language]
+
+    def _iter_codebook(self):
+        for keyword, form in self.forms.items():
+            section_label = str(getattr(form.Meta, 'label', keyword))
+            fields = [
+                (name, None, field) for name, field in form.base_fields.items()]
+            for repeating_field in getattr(form.Meta, 'repeating_fields', []):
+                fields.extend(
+                    (repeating_field.name, row_key, row_field)
+                    for row_key, (row_field, __) in repeating_field.row.items())
+
+            for name, row_key, field in fields:
+                if not hasattr(field, '_choices'):
+                    continue
+                for code, option in field._choices:
+                    # Do not include empty (placeholder) options
+                    if not code:
+                        continue
+                    yield CodebookEntry(
+                        section=section_label, question=str(field.label),
+                        option=str(option), code=code, keyword=keyword,
+                        field_name=name, row_key=row_key)
+
+    def get_choice_labels(self, language: str=None) -> dict:
+        """
+        Return the labels of the options for each selection field, as dict
+        {(keyword, field name, row key): {code: label}}. The row key is None
+        for fields which are not part of a repeating row.
+        """
+        language = language or translation.get_language()
+        if language not in self.choice_labels:
+            labels = collections.OrderedDict()
+            for entry in self.get_codebook(language):
+                labels.setdefault(
+                    (entry.keyword, entry.field_name, entry.row_key), {}
+                )[entry.code] = entry.option
+            self.choice_labels[language] = labels
+        return self.choice_labels[language]
+
+    @staticmethod
+    def _get_value_getter(definition: StructureProperty):
+        """
+        Return a function to get the value of a property from the data of its
+        section.
+        """
+        if definition.index is not None:
+            def list_getter(section_data):
+                try:
+                    return section_data[definition.field_name][
+                        definition.index][definition.row_key]
+                except (IndexError, KeyError, AttributeError, TypeError):
+                    return ''
+            return list_getter
+
+        if type(definition.field).from_json is JsonMixin.from_json:
+            return operator.methodcaller('get', definition.field_name)
+
+        def field_getter(section_data):
+            return definition.field.from_json(
+                data=section_data, name=definition.field_name)
+        return field_getter
+
 
 class AutoSpawn:
     """
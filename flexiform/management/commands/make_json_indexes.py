@@ -0,0 +1,161 @@
+import collections
+import hashlib
+
+from django.apps import apps
+from django.contrib.postgres.operations import TrigramExtension
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, migrations
+from django.db.migrations.autodetector import MigrationAutodetector
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.writer import MigrationWriter
+
+from ...search import is_searchable
+
+# An expression index on the JSON data: the SQL to create and drop it, along
+# with a description of the queries it serves.
+JsonIndex = collections.namedtuple(
+    'JsonIndex', ['name', 'sql', 'reverse_sql', 'usage'])
+
+
+class Command(BaseCommand):
+    help = 'Create a migration with expression indexes for the JSON paths ' \
+           'which are queried: the chart_fields and index_fields of the ' \
+           'forms (btree) and the search_lookup_paths of the model ' \
+           '(trigram). PostgreSQL only.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', help='The model, as <app_label>.<Model>')
+        parser.add_argument(
+            '--gin', action='store_true',
+            help='Add a GIN index on "data" for containment lookups '
+                 '(data__contains).')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only show the migration, do not write it.')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        try:
+            model = apps.get_model(options['model'])
+        except (LookupError, ValueError) as e:
+            raise CommandError(e)
+        connection = connections[options['database']]
+        if connection.vendor != 'postgresql':
+            raise CommandError('Expression indexes require PostgreSQL.')
+
+        indexes = list(self.get_indexes(model, connection, options['gin']))
+        if not indexes:
+            self.stdout.write('No JSON paths to index.')
+            return
+
+        self.stdout.write('Indexes and the queries using them:')
+        for index in indexes:
+            self.stdout.write(f'  {index.name}: {index.usage}')
+
+        operations = [
+            migrations.RunSQL(sql=index.sql, reverse_sql=index.reverse_sql)
+            for index in indexes]
+        if any('gin_trgm_ops' in index.sql for index in indexes):
+            operations.insert(0, TrigramExtension())
+
+        writer = self.get_migration_writer(model, operations)
+        if options['dry_run']:
+            self.stdout.write(writer.as_string())
+            return
+        with open(writer.path, 'w', encoding='utf-8') as f:
+            f.write(writer.as_string())
+        self.stdout.write(f'Created {writer.path}')
+
+    def get_indexes(self, model, connection, gin: bool=False):
+        table = model._meta.db_table
+        structure = getattr(model._meta, 'structure', None)
+        promoted_fields = structure.get_promoted_fields() if structure else {}
+        for keyword, form in getattr(structure, 'forms', {}).items():
+            # Promoted fields are queried in their model field, which can be
+            # indexed with db_index.
+            json_fields = [
+                name for name, __, is_json in form.model_fields()
+                if is_json and (keyword, name) not in promoted_fields]
+            chart_fields = getattr(form.Meta, 'chart_fields', [])
+            index_fields = getattr(form.Meta, 'index_fields', [])
+            for name in json_fields:
+                lookup = f'data__{keyword}__{name}'
+                if name in index_fields:
+                    usage = f'Filters {lookup}=<value> and ' \
+                            f'{lookup}__in=<values>.'
+                elif name in chart_fields:
+                    # ChartsView selects the question of all objects of the
+                    # topics, it does not filter by the question.
+                    usage = f'Filters {lookup}=<value> and ' \
+                            f'{lookup}__in=<values> on the chart question. ' \
+                            f'Not used by ChartsView (promote the field).'
+                else:
+                    continue
+                expression = get_lookup_sql(
+                    model, connection, lookup, 'x', ' = ')
+                yield self.get_index(table, f'(({expression}))', usage)
+
+        if hasattr(model, 'search_lookup_paths') and not is_searchable(model):
+            for path in model.search_lookup_paths:
+                if tuple(path) in promoted_fields:
+                    continue
+                lookup = '__'.join(('data',) + tuple(path) + ('icontains',))
+                expression = get_lookup_sql(
+                    model, connection, lookup, 'x', ' LIKE ')
+                yield self.get_index(
+                    table, f'USING gin (({expression}) gin_trgm_ops)',
+                    f'AjaxSearchListView ({lookup}).')
+
+        if gin:
+            yield self.get_index(
+                table, 'USING gin ("data" jsonb_path_ops)',
+                'Containment lookups (data__contains=<dict>).')
+
+    @staticmethod
+    def get_index(table: str, definition: str, usage: str) -> JsonIndex:
+        digest = hashlib.sha1(definition.encode()).hexdigest()[:10]
+        name = f'{table[:40]}_json_{digest}'
+        return JsonIndex(
+            name=name,
+            sql=f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" '
+                f'{definition};',
+            reverse_sql=f'DROP INDEX IF EXISTS "{name}";',
+            usage=usage)
+
+    @staticmethod
+    def get_migration_writer(model, operations: list) -> MigrationWriter:
+        app_label = model._meta.app_label
+        loader = MigrationLoader(None, ignore_no_migrations=True)
+        leaf_nodes = loader.graph.leaf_nodes(app_label)
+        number = 1
+        if leaf_nodes:
+            number = MigrationAutodetector.parse_number(leaf_nodes[0][1]) + 1
+
+        migration = type('Migration', (migrations.Migration, ), {
+            'dependencies': leaf_nodes,
+            'operations': operations,
+        })(f'{number:04d}_json_indexes', app_label)
+        return MigrationWriter(migration)
+
+
+def get_lookup_sql(model, connection, lookup: str, value, operator: str) -> str:
+    """
+    Return the SQL Django uses for the left-hand side of a lookup (e.g. the
+    extracted JSON value), with the parameters inlined and without table
+    name, as needed for the expression of an index. The index is only used
+    if its expression matches the one of the query.
+    """
+    query = model._default_manager.filter(**{lookup: value}).query
+    compiler = query.get_compiler(connection=connection)
+    sql, params = query.where.as_sql(compiler, connection)
+    lhs = sql.split(operator, 1)[0]
+    lhs_params = params[:lhs.count('%s')]
+    lhs = lhs % tuple(quote_sql_value(param) for param in lhs_params)
+    return lhs.replace(f'{connection.ops.quote_name(model._meta.db_table)}.', '')
+
+
+def quote_sql_value(value) -> str:
+    if isinstance(value, (list, tuple)):
+        return 'ARRAY[%s]' % ', '.join(quote_sql_value(v) for v in value)
+    value = str(value).replace("'", "''")
+    return f"'{value}'"
@@ -0,0 +1,60 @@
+from django.apps import apps
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from ...versioning import bump_model_version
+
+
+class Command(BaseCommand):
+    help = 'Fill the model fields of promoted JSON fields (Meta option ' \
+           'promoted_fields of the forms) from the data of all objects.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', help='The model, as <app_label>.<Model>')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            model = apps.get_model(options['model'])
+        except (LookupError, ValueError) as e:
+            raise CommandError(e)
+        structure = getattr(model._meta, 'structure', None)
+        columns = structure.get_promoted_fields().values() if structure else []
+        if not columns:
+            raise CommandError(f'{options["model"]} has no promoted fields.')
+
+        batch_size = options['batch_size']
+        queryset = model._default_manager.only('pk', 'data').order_by('pk')
+        batch = []
+        count = 0
+        skipped = 0
+        for obj in queryset.iterator(chunk_size=batch_size):
+            try:
+                values = structure.get_promoted_values(obj.data)
+            except ValidationError as e:
+                # Values which do not fit the model field, e.g. from before
+                # the field was promoted.
+                skipped += 1
+                self.stderr.write(
+                    f'Skipped {obj.pk}: {" ".join(e.messages)}')
+                continue
+            for column, value in values.items():
+                setattr(obj, column, value)
+            batch.append(obj)
+            if len(batch) == batch_size:
+                count += self.save(model, batch, columns)
+                batch = []
+        count += self.save(model, batch, columns)
+        # bulk_update sends no signals: change the data version (e.g. of
+        # cached exports) here.
+        bump_model_version(model)
+        self.stdout.write(f'Updated {count} objects.')
+        if skipped:
+            self.stderr.write(f'Skipped {skipped} objects with invalid values.')
+
+    @staticmethod
+    def save(model, objects: list, columns) -> int:
+        with transaction.atomic():
+            model._default_manager.bulk_update(objects, list(columns))
+        return len(objects)
@@ -0,0 +1,47 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from ...search import is_searchable, update_search_text
+from ...versioning import bump_model_version
+
+
+class Command(BaseCommand):
+    help = 'Fill the search_field of all objects of a model, e.g. after ' \
+           'adding the field or changing the search_lookup_paths.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', help='The model, as <app_label>.<Model>')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            model = apps.get_model(options['model'])
+        except (LookupError, ValueError) as e:
+            raise CommandError(e)
+        if not is_searchable(model):
+            raise CommandError(
+                f'{options["model"]} has no search_field and '
+                f'search_lookup_paths.')
+
+        batch_size = options['batch_size']
+        queryset = model._default_manager.only('pk', 'data').order_by('pk')
+        batch = []
+        count = 0
+        for obj in queryset.iterator(chunk_size=batch_size):
+            update_search_text(obj)
+            batch.append(obj)
+            if len(batch) == batch_size:
+                count += self.save(model, batch)
+                batch = []
+        count += self.save(model, batch)
+        # bulk_update sends no signals: change the data version (e.g. of
+        # cached exports) here.
+        bump_model_version(model)
+        self.stdout.write(f'Updated {count} objects.')
+
+    @staticmethod
+    def save(model, objects: list) -> int:
+        with transaction.atomic():
+            model._default_manager.bulk_update(objects, [model.search_field])
+        return len(objects)
@@ -1,5 +1,7 @@
 import contextlib
 
+from django.db import models
+
 from .conf import FlexiFormConf  # noqa
 
 
@@ -18,3 +20,24 @@ def autodiscover():
         # Fail silently
         with contextlib.suppress(Exception):
             import_module(f'{app}.forms')
+
+
+class Change(models.Model):
+    """
+    The latest change of an object of a tracked model. Each object has at most
+    one row, which is replaced on every change: the (increasing) ID of the row
+    serves as cursor for delta downloads. Deleted objects are kept as
+    tombstones.
+    """
+    id = models.BigAutoField(primary_key=True)
+    model = models.CharField(max_length=255)
+    object_id = models.CharField(max_length=255)
+    deleted = models.BooleanField(default=False)
+    timestamp = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('model', 'object_id')
+        indexes = [models.Index(fields=['model', 'id'])]
+
+    def __str__(self):
+        return f'{self.model} {self.object_id}'
@@ -0,0 +1,151 @@
+import base64
+import json
+
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+from django.utils.translation import ugettext_lazy as _
+
+
+def get_estimated_count(queryset) -> int or None:
+    """
+    Return the number of rows the PostgreSQL planner estimates for the
+    queryset (EXPLAIN), which does not scan the table like COUNT(*). Returns
+    None for other databases.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    A paginator using the estimated count of large querysets. Querysets
+    estimated below exact_count_limit rows are counted exactly.
+
+    As the estimate may be too low, pages past the estimate are valid as long
+    as they contain objects, and the number of pages grows accordingly.
+    """
+    exact_count_limit = 10000
+    # Set by page(): the number of pages known to exist.
+    known_num_pages = 0
+
+    @cached_property
+    def estimated_count(self) -> int or None:
+        if isinstance(self.object_list, QuerySet):
+            return get_estimated_count(self.object_list)
+        return None
+
+    @property
+    def is_estimated(self) -> bool:
+        return self.estimated_count is not None and \
+               self.estimated_count >= self.exact_count_limit
+
+    @cached_property
+    def count(self):
+        if self.is_estimated:
+            return self.estimated_count
+        return super().count
+
+    @property
+    def num_pages(self):
+        return max(super().num_pages, self.known_num_pages)
+
+    def validate_number(self, number):
+        if not self.is_estimated:
+            return super().validate_number(number)
+        # Only check the number itself, the pages are checked by page().
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(_('That page number is not an integer'))
+        if number < 1:
+            raise EmptyPage(_('That page number is less than 1'))
+        return number
+
+    def page(self, number):
+        if not self.is_estimated:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        # One more object tells whether there is a next page.
+        objects = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not objects and number > 1:
+            raise EmptyPage(_('That page contains no results'))
+        has_next = len(objects) > self.per_page
+        self.known_num_pages = max(
+            self.known_num_pages, number + 1 if has_next else number)
+        return self._get_page(objects[:self.per_page], number, self)
+
+
+def encode_cursor(obj, ordering: tuple) -> str:
+    """
+    Return the values of the ordering fields of an object (or a dict of
+    values) as cursor, to continue after this object.
+    """
+    values = [
+        obj[field.lstrip('-')] if isinstance(obj, dict)
+        else getattr(obj, field.lstrip('-'))
+        for field in ordering]
+    data = json.dumps(values, cls=DjangoJSONEncoder).encode()
+    return base64.urlsafe_b64encode(data).decode()
+
+
+def decode_cursor(cursor: str, ordering: tuple) -> list:
+    """
+    Return the values of a cursor. Raises ValueError for invalid cursors.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (TypeError, ValueError, UnicodeError):
+        raise ValueError(f'Invalid cursor: {cursor}')
+    if not isinstance(values, list) or len(values) != len(ordering):
+        raise ValueError(f'Invalid cursor: {cursor}')
+    return values
+
+
+def filter_after(queryset, ordering: tuple, values: list):
+    """
+    Return the objects after the given values of the ordering fields (keyset
+    pagination): e.g. for the ordering ('-created', '-pk'), the objects with
+    created < a, or created = a and pk < b. The ordering must be unique.
+    """
+    q_objects = Q()
+    for i, field in enumerate(ordering):
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition = Q(**{f'{field.lstrip("-")}__{lookup}': values[i]})
+        for previous_field, value in zip(ordering[:i], values[:i]):
+            condition &= Q(**{previous_field.lstrip('-'): value})
+        q_objects |= condition
+    return queryset.filter(q_objects).order_by(*ordering)
+
+
+def get_keyset_page(queryset, ordering: tuple, page_size: int,
+                    cursor: str=None) -> tuple:
+    """
+    Return the objects of the page after the cursor (or the first page), and
+    the cursor of the next page (None on the last page). Only page_size + 1
+    objects are fetched, without COUNT(*) or OFFSET.
+
+    :return: tuple(list, str or None)
+    """
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        queryset = filter_after(
+            queryset, ordering, decode_cursor(cursor, ordering))
+    objects = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(objects) > page_size:
+        next_cursor = encode_cursor(objects[page_size - 1], ordering)
+    return objects[:page_size], next_cursor
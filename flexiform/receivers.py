@@ -1,6 +1,11 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
+from .changes import is_tracked, record_change
+from .search import is_searchable, update_search_text
+from .versioning import bump_model_version, bump_object_version, is_versioned
+
 
 @receiver(post_save)
 def update_report_builder_properties(sender, **kwargs):
@@ -9,3 +14,43 @@ def update_report_builder_properties(sender, **kwargs):
     """
     if hasattr(sender, '_meta') and hasattr(sender._meta, 'structure'):
         sender._meta.structure.update_properties()
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def update_model_version(sender, instance, using, **kwargs):
+    """
+    Change the data version of the model and the object, this invalidates
+    e.g. cached exports and the ETags of the views. The versions change once
+    the transaction is committed: until then, other requests still read the
+    previous data, which must not be stored under the new version.
+    """
+    if is_versioned(sender):
+        pk = instance.pk
+
+        def bump():
+            bump_model_version(sender, objects=False)
+            bump_object_version(sender, pk)
+
+        transaction.on_commit(bump, using=using)
+
+
+@receiver(post_save)
+def track_save(sender, instance, using, **kwargs):
+    if is_tracked(sender):
+        record_change(instance, using=using)
+
+
+@receiver(post_delete)
+def track_delete(sender, instance, using, **kwargs):
+    if is_tracked(sender):
+        record_change(instance, deleted=True, using=using)
+
+
+@receiver(pre_save)
+def update_search_field(sender, instance, **kwargs):
+    """
+    Store the text of the search_lookup_paths in the search_field.
+    """
+    if is_searchable(sender):
+        update_search_text(instance)
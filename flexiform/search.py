@@ -0,0 +1,36 @@
+def get_search_text(data: dict, lookup_paths: list) -> str:
+    """
+    Return the values found at the search_lookup_paths of a model as a single
+    case-folded text, which is stored in the model's search_field. The search
+    case-folds the term as well and uses a case-sensitive lookup, which an
+    index on the field can serve.
+    """
+    values = []
+    for path in lookup_paths:
+        values.extend(_get_values(data, path))
+    return ' '.join(' '.join(values).split()).casefold()
+
+
+def _get_values(data, path: tuple) -> list:
+    if isinstance(data, list):
+        # Repeating rows
+        return [value for item in data for value in _get_values(item, path)]
+    if not path:
+        return [] if data in ('', None) else [str(data)]
+    if not isinstance(data, dict):
+        return []
+    return _get_values(data.get(path[0]), path[1:])
+
+
+def is_searchable(model) -> bool:
+    """
+    Models with a search_field store the text of their search_lookup_paths
+    in this field.
+    """
+    return bool(getattr(model, 'search_field', None)) and hasattr(
+        model, 'search_lookup_paths')
+
+
+def update_search_text(obj) -> None:
+    setattr(obj, obj.search_field, get_search_text(
+        obj.data or {}, obj.search_lookup_paths))
@@ -0,0 +1,16 @@
+from django.contrib.postgres.fields import JSONField
+from django.db import models
+
+
+class Interview(models.Model):
+    """
+    A model storing its data in JSON, only used by the tests (not migrated).
+    """
+    name = models.CharField(max_length=255, blank=True)
+    data = JSONField(null=True)
+
+    search_lookup_paths = [('interviewee', 'name')]
+
+    class Meta:
+        app_label = 'flexiform'
+        managed = False
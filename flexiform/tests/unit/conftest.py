@@ -0,0 +1,31 @@
+from types import SimpleNamespace
+
+import pytest
+from django.db.models.sql.compiler import SQLCompiler
+from django.db.models.sql.constants import SINGLE
+
+
+@pytest.fixture
+def db_rows(monkeypatch):
+    """
+    Answer the queries with the given rows (dicts of the selected columns by
+    attname or annotation name) instead of a database. The SQL of the
+    queries is still compiled and kept.
+    """
+    result = SimpleNamespace(rows=[], queries=[], columns=[])
+
+    def execute_sql(compiler, result_type=None, *args, **kwargs):
+        sql, params = compiler.as_sql()
+        result.queries.append((sql, params))
+        names = [
+            alias or expression.target.attname
+            for expression, _, alias in compiler.select]
+        result.columns.append(names)
+        rows = [
+            tuple(row.get(name) for name in names) for row in result.rows]
+        if result_type == SINGLE:
+            return rows[0] if rows else None
+        return iter([rows])
+
+    monkeypatch.setattr(SQLCompiler, 'execute_sql', execute_sql)
+    return result
@@ -0,0 +1,122 @@
+from unittest.mock import MagicMock, sentinel
+
+import pytest
+from django.http import Http404
+from django.test import override_settings
+
+from ...changes import (Changes, _lock_changes, get_changes, is_tracked,
+                        record_change)
+from ...models import Change
+from ...views import DownloadMixin
+from ..models import Interview
+
+
+class TestIsTracked:
+
+    def test_disabled(self):
+        assert not is_tracked(MagicMock())
+
+    @override_settings(FLEXIFORM_TRACK_CHANGES=True)
+    def test_structure(self):
+        assert is_tracked(MagicMock())
+
+    @override_settings(FLEXIFORM_TRACK_CHANGES=True)
+    def test_no_structure(self):
+        model = MagicMock()
+        del model._meta.structure
+        assert not is_tracked(model)
+
+
+class TestLockChanges:
+
+    @pytest.fixture
+    def connection(self, monkeypatch):
+        connection = MagicMock(vendor='postgresql')
+        monkeypatch.setattr(
+            'flexiform.changes.connections', {'default': connection})
+        return connection
+
+    def test_postgresql(self, connection):
+        _lock_changes('app.model')
+        cursor = connection.cursor.return_value.__enter__.return_value
+        sql, params = cursor.execute.call_args[0]
+        assert sql == 'SELECT pg_advisory_xact_lock(%s)'
+        # The same lock for all changes of the model.
+        _lock_changes('app.model')
+        assert cursor.execute.call_args[0][1] == params
+        _lock_changes('app.other')
+        assert cursor.execute.call_args[0][1] != params
+
+    def test_other_database(self, connection):
+        connection.vendor = 'sqlite'
+        _lock_changes('app.model')
+        connection.cursor.assert_not_called()
+
+
+class TestRecordChange:
+
+    def test_in_transaction(self, monkeypatch):
+        objects = MagicMock()
+        monkeypatch.setattr(Change, 'objects', objects)
+        lock = MagicMock()
+        monkeypatch.setattr('flexiform.changes._lock_changes', lock)
+        atomic = MagicMock()
+        monkeypatch.setattr('flexiform.changes.transaction.atomic', atomic)
+        on_commit = MagicMock()
+        monkeypatch.setattr('flexiform.changes.transaction.on_commit', on_commit)
+
+        record_change(Interview(pk=4), deleted=True)
+        atomic.assert_called_once_with(using=None)
+        lock.assert_called_once_with('flexiform.interview', using=None)
+        changes = objects.using.return_value
+        changes.filter.assert_called_once_with(
+            model='flexiform.interview', object_id='4')
+        changes.create.assert_called_once_with(
+            model='flexiform.interview', object_id='4', deleted=True)
+        on_commit.assert_not_called()
+
+
+class TestGetChanges:
+
+    def test_subquery(self):
+        changes = get_changes(Interview, since=3, cursor=5)
+        assert changes.cursor == 5
+        sql = str(Interview.objects.filter(pk__in=changes.changed).query)
+        assert 'IN (SELECT CAST(' in sql
+        assert 'U0."id" > 3 AND U0."id" <= 5' in sql
+
+
+class TestDeltaDownload:
+
+    @pytest.fixture
+    def view(self):
+        view = DownloadMixin()
+        view.model = MagicMock()
+        view.request = MagicMock(GET={})
+        return view
+
+    def test_no_delta(self, view):
+        view.set_changes()
+        assert view.changes is None
+
+    @override_settings(FLEXIFORM_TRACK_CHANGES=True)
+    @pytest.mark.parametrize('params', [
+        {'since': 'foo', 'format': 'zip'},
+        {'since': '3', 'format': 'csv'},
+    ])
+    def test_invalid_delta(self, view, params):
+        view.request.GET = params
+        with pytest.raises(Http404):
+            view.set_changes()
+
+    def test_download_queryset(self, view):
+        view.get_queryset = MagicMock()
+        view.changes = Changes(
+            cursor=5, changed=sentinel.changed, deleted=sentinel.deleted)
+        view.get_download_queryset()
+        view.get_queryset.return_value.filter.assert_called_once_with(
+            pk__in=sentinel.changed)
+
+    def test_set_cursor(self):
+        response = DownloadMixin.set_cursor({}, 5)
+        assert response['X-Flexiform-Cursor'] == '5'
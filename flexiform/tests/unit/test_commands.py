@@ -0,0 +1,145 @@
+import io
+from unittest.mock import MagicMock
+
+import pytest
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db.backends.postgresql.base import DatabaseWrapper
+from django.db.migrations.writer import MigrationWriter
+
+from ...fields import JsonCharField
+from ...forms import BaseForm
+from ...management.commands import (make_json_indexes, promote_json_fields,
+                                    update_search_text)
+from ...management.commands.make_json_indexes import Command, quote_sql_value
+from ..models import Interview
+
+
+class TestMakeJsonIndexes:
+
+    def test_quote_sql_value(self):
+        assert quote_sql_value(['a', "it's"]) == "ARRAY['a', 'it''s']"
+
+    def test_get_index(self):
+        index = Command.get_index('app_model', '(("data" -> \'a\'))', 'usage')
+        assert index.name.startswith('app_model_json_')
+        assert index.sql == (
+            f'CREATE INDEX IF NOT EXISTS "{index.name}" ON "app_model" '
+            f'(("data" -> \'a\'));')
+        assert index.reverse_sql == f'DROP INDEX IF EXISTS "{index.name}";'
+
+    @pytest.fixture
+    def migration(self, tmp_path, monkeypatch):
+        """
+        Run the command for the test model on PostgreSQL (the SQL is only
+        compiled) and return the written migration.
+        """
+        connection = DatabaseWrapper({
+            'NAME': 'test', 'USER': '', 'PASSWORD': '', 'HOST': '',
+            'PORT': '', 'OPTIONS': {}, 'TIME_ZONE': None, 'CONN_MAX_AGE': 0,
+            'AUTOCOMMIT': True, 'ATOMIC_REQUESTS': False})
+        monkeypatch.setattr(
+            make_json_indexes, 'connections', {'default': connection})
+
+        class Form(BaseForm):
+            color = JsonCharField()
+            size = JsonCharField()
+            note = JsonCharField()
+
+            class Meta:
+                chart_fields = ['color']
+                index_fields = ['size']
+
+        structure = MagicMock(forms={'section': Form})
+        structure.get_promoted_fields.return_value = {}
+        monkeypatch.setattr(
+            Interview._meta, 'structure', structure, raising=False)
+
+        path = tmp_path / '0002_json_indexes.py'
+        monkeypatch.setattr(
+            MigrationWriter, 'path', property(lambda writer: str(path)))
+        written = {}
+        get_migration_writer = Command.get_migration_writer
+
+        def capture(model, operations):
+            written['writer'] = get_migration_writer(model, operations)
+            return written['writer']
+
+        monkeypatch.setattr(
+            Command, 'get_migration_writer', staticmethod(capture))
+        call_command(
+            'make_json_indexes', 'flexiform.Interview', stdout=io.StringIO())
+        written['source'] = path.read_text()
+        return written
+
+    def test_operations(self, migration):
+        operations = migration['writer'].migration.operations
+        assert [type(o).__name__ for o in operations] == [
+            'TrigramExtension', 'RunSQL', 'RunSQL', 'RunSQL']
+        sql = [o.sql for o in operations[1:]]
+        assert 'ON "flexiform_interview" ((("data" #> ARRAY[\'section\', ' \
+               '\'color\'])));' in sql[0]
+        assert 'ON "flexiform_interview" ((("data" #> ARRAY[\'section\', ' \
+               '\'size\'])));' in sql[1]
+        assert 'USING gin ((UPPER(("data" #>> ARRAY[\'interviewee\', ' \
+               '\'name\'])::text)) gin_trgm_ops);' in sql[2]
+        # Not charted nor declared in index_fields
+        assert not any('note' in statement for statement in sql)
+        assert migration['writer'].migration.dependencies == [
+            ('flexiform', '0001_initial')]
+        assert 'DROP INDEX IF EXISTS' in migration['source']
+
+    def test_usage(self, migration):
+        indexes = list(Command().get_indexes(
+            Interview, make_json_indexes.connections['default']))
+        assert indexes[0].usage == (
+            'Filters data__section__color=<value> and '
+            'data__section__color__in=<values> on the chart question. '
+            'Not used by ChartsView (promote the field).')
+        assert indexes[1].usage == (
+            'Filters data__section__size=<value> and '
+            'data__section__size__in=<values>.')
+        assert indexes[2].usage == \
+            'AjaxSearchListView (data__interviewee__name__icontains).'
+
+
+class TestBackfillCommands:
+
+    @pytest.mark.parametrize('module', [promote_json_fields, update_search_text])
+    def test_bump_model_version(self, module, monkeypatch):
+        attributes = {'search_field': 'search_text', 'search_lookup_paths': []}
+        model = MagicMock(**attributes)
+        model._meta.structure.get_promoted_fields.return_value = {
+            ('a', 'b'): 'a_b'}
+        model._default_manager.only.return_value.order_by.return_value.\
+            iterator.return_value = [MagicMock(data={}, **attributes)]
+        bump_model_version = MagicMock()
+        monkeypatch.setattr(module.apps, 'get_model', lambda name: model)
+        monkeypatch.setattr(module, 'transaction', MagicMock())
+        monkeypatch.setattr(module, 'bump_model_version', bump_model_version)
+        module.Command(stdout=MagicMock()).handle(
+            model='app.Model', batch_size=10)
+        bump_model_version.assert_called_once_with(model)
+
+    def test_promote_invalid_value(self, monkeypatch):
+        model = MagicMock()
+        structure = model._meta.structure
+        structure.get_promoted_fields.return_value = {('a', 'b'): 'a_b'}
+        structure.get_promoted_values.side_effect = [
+            ValidationError('Enter a whole number.'), {'a_b': 3}]
+        objects = [MagicMock(pk=1), MagicMock(pk=2)]
+        model._default_manager.only.return_value.order_by.return_value.\
+            iterator.return_value = objects
+        monkeypatch.setattr(
+            promote_json_fields.apps, 'get_model', lambda name: model)
+        monkeypatch.setattr(promote_json_fields, 'transaction', MagicMock())
+        monkeypatch.setattr(
+            promote_json_fields, 'bump_model_version', MagicMock())
+        stdout, stderr = io.StringIO(), io.StringIO()
+        promote_json_fields.Command(stdout=stdout, stderr=stderr).handle(
+            model='app.Model', batch_size=10)
+        model._default_manager.bulk_update.assert_called_once_with(
+            [objects[1]], ['a_b'])
+        assert objects[1].a_b == 3
+        assert 'Skipped 1: Enter a whole number.' in stderr.getvalue()
+        assert 'Updated 1 objects.' in stdout.getvalue()
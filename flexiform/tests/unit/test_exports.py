@@ -0,0 +1,131 @@
+import datetime
+import gzip
+import io
+
+import pytest
+from django.forms import fields
+from django.test import override_settings
+
+from ...exports import (BOOLEAN, DATE, INTEGER, STRING, CachedExport,
+                        build_columns,
+                        columns_to_dataframe, convert_value,
+                        get_form_field_type, iter_columnar, iter_compressed)
+from ...fields import JsonCharField, JsonIntegerField
+
+
+class TestValueTypes:
+
+    @pytest.mark.parametrize('field, value_type', [
+        (JsonCharField(), STRING),
+        (JsonIntegerField(), INTEGER),
+        (fields.DateField(), DATE),
+        (fields.NullBooleanField(), BOOLEAN),
+        (fields.DecimalField(), STRING),
+    ])
+    def test_form_field_type(self, field, value_type):
+        assert get_form_field_type(field) == value_type
+
+    @pytest.mark.parametrize('value, value_type, expected', [
+        ('12', INTEGER, 12),
+        ('', INTEGER, None),
+        ('foo', INTEGER, None),
+        ('2018-03-01', DATE, datetime.date(2018, 3, 1)),
+        (False, BOOLEAN, False),
+        (12, STRING, '12'),
+    ])
+    def test_convert_value(self, value, value_type, expected):
+        assert convert_value(value, value_type) == expected
+
+
+class TestIterColumnar:
+
+    @pytest.mark.parametrize('file_format', ['parquet', 'arrow'])
+    def test_typed_columns(self, file_format):
+        pa = pytest.importorskip('pyarrow')
+        rows = [[1, '2018-03-01', 'foo'], [2, None, '']]
+        data = b''.join(iter_columnar(
+            header=['id', 'date', 'text'], value_types=[INTEGER, DATE, STRING],
+            rows=rows, file_format=file_format, batch_size=1))
+
+        if file_format == 'parquet':
+            import pyarrow.parquet
+            table = pyarrow.parquet.read_table(io.BytesIO(data))
+        else:
+            table = pa.ipc.open_stream(data).read_all()
+        assert table.schema.types == [pa.int64(), pa.date32(), pa.string()]
+        assert table.to_pydict() == {
+            'id': [1, 2],
+            'date': [datetime.date(2018, 3, 1), None],
+            'text': ['foo', None],
+        }
+
+
+class TestIterCompressed:
+
+    def test_gzip(self):
+        chunks = [b'a,b\r\n', b'1,2\r\n'] * 100
+        data = b''.join(iter_compressed(iter(chunks), 'gzip'))
+        assert gzip.decompress(data) == b''.join(chunks)
+
+    def test_zstd(self):
+        zstandard = pytest.importorskip('zstandard')
+        chunks = [b'a,b\r\n', b'1,2\r\n']
+        data = b''.join(iter_compressed(iter(chunks), 'zstd'))
+        assert zstandard.ZstdDecompressor().decompressobj().decompress(
+            data) == b''.join(chunks)
+
+
+class TestBuildColumns:
+
+    def test_typed_columns(self):
+        np = pytest.importorskip('numpy')
+        columns = build_columns(
+            header=['id', 'date', 'text'], value_types=[INTEGER, DATE, STRING],
+            rows=[[1, '2018-03-01', 'foo'], ['', None, '']], chunk_size=1)
+
+        assert list(columns.keys()) == ['id', 'date', 'text']
+        assert columns['id'].dtype == np.int64
+        assert columns['id'].mask.tolist() == [False, True]
+        assert columns['date'].tolist() == [datetime.date(2018, 3, 1), None]
+        assert columns['text'].tolist() == ['foo', None]
+
+    def test_dataframe(self):
+        pytest.importorskip('pandas')
+        columns = build_columns(
+            header=['id', 'flag'], value_types=[INTEGER, BOOLEAN],
+            rows=[[1, True], [None, None]], chunk_size=10)
+        df = columns_to_dataframe(columns)
+        assert str(df['id'].dtype) == 'Int64'
+        assert str(df['flag'].dtype) == 'boolean'
+        assert df['id'].isna().tolist() == [False, True]
+
+
+class TestCachedExport:
+
+    @pytest.fixture(autouse=True)
+    def export_root(self, tmp_path):
+        with override_settings(FLEXIFORM_EXPORT_ROOT=str(tmp_path)):
+            yield tmp_path
+
+    def test_write(self):
+        cached_export = CachedExport(['foo'], 'v1', 'export.csv')
+        assert not cached_export.exists()
+        assert list(cached_export.write(iter([b'a', b'b']))) == [b'a', b'b']
+        assert cached_export.exists()
+        with open(cached_export.path, 'rb') as f:
+            assert f.read() == b'ab'
+
+    def test_interrupted(self):
+        cached_export = CachedExport(['foo'], 'v1', 'export.csv')
+        chunks = cached_export.write(iter([b'a', b'b']))
+        next(chunks)
+        chunks.close()
+        assert not cached_export.exists()
+
+    def test_new_version(self):
+        old = CachedExport(['foo'], 'v1', 'export.csv')
+        list(old.write(iter([b'a'])))
+        new = CachedExport(['foo'], 'v2', 'export.csv')
+        list(new.write(iter([b'b'])))
+        assert new.exists()
+        assert not old.exists()
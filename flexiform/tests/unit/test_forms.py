@@ -1,5 +1,5 @@
 import collections
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, Mock
 
 import pytest
 from django.forms import fields, widgets
@@ -109,3 +109,40 @@ class TestBaseForm:
         assert obj.data == {'section2': {'one': [
             {'one1': '', 'one2': '2'},
         ]}}
+
+
+class TestSave:
+
+    def test_atomic(self, monkeypatch):
+        events = []
+
+        class Atomic:
+            def __enter__(self):
+                events.append('begin')
+
+            def __exit__(self, *args):
+                events.append('commit')
+
+        monkeypatch.setattr('flexiform.forms.transaction.atomic', Atomic)
+
+        class Form(BaseForm):
+            class Meta:
+                model = MagicMock()
+                fields = []
+                through_fields = [MagicMock()]
+                link_fields = [MagicMock()]
+
+        obj = MagicMock()
+        obj.save.side_effect = lambda: events.append('save')
+        Form.Meta.model.objects.update_or_create.return_value = obj, True
+        form = Form.__new__(Form)
+        form.cleaned_data = {}
+        form.fields = MagicMock()
+        form.to_model = Mock(return_value=({}, []))
+        form.save_through = Mock(side_effect=lambda *args: events.append(
+            'through'))
+        form.save_link = Mock(side_effect=lambda *args: events.append('link'))
+
+        assert form.save() is obj
+        # The version is bumped on commit, after the related objects.
+        assert events == ['begin', 'save', 'through', 'link', 'commit']
@@ -0,0 +1,22 @@
+from unittest.mock import Mock
+
+from ...fragments import get_fragment_key, render_cached
+
+
+class TestRenderCached:
+
+    def test_no_key(self):
+        render = Mock(return_value='<p>a</p>')
+        assert render_cached(None, render) == '<p>a</p>'
+        assert render_cached(None, render) == '<p>a</p>'
+        assert render.call_count == 2
+
+    def test_cached(self):
+        key = get_fragment_key(['app.model', 1, 'v1', 'section', 'en'])
+        render = Mock(return_value='<p>a</p>')
+        assert render_cached(key, render) == '<p>a</p>'
+        assert render_cached(key, render) == '<p>a</p>'
+        render.assert_called_once_with()
+
+    def test_key(self):
+        assert get_fragment_key(['a', 'v1']) != get_fragment_key(['a', 'v2'])
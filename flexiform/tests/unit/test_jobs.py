@@ -0,0 +1,70 @@
+import time
+
+import pytest
+from django.test import override_settings
+
+from ...jobs import DONE, FAILED, QUEUED, ExportJob, ExportJobRunner
+
+
+class TestExportJob:
+
+    @pytest.fixture(autouse=True)
+    def export_root(self, tmp_path):
+        with override_settings(FLEXIFORM_EXPORT_ROOT=str(tmp_path)):
+            yield tmp_path
+
+    def test_create(self):
+        job = ExportJob.create(filename='export.csv', content_type='text/csv')
+        assert job.get_status()['status'] == QUEUED
+        assert ExportJob(job.id).get_status()['filename'] == 'export.csv'
+
+    def test_run(self):
+        job = ExportJob.create(filename='export.csv', content_type='text/csv')
+        job.run(iter([b'a,b\r\n', b'1,2\r\n']))
+        assert job.get_status()['status'] == DONE
+        assert job.get_status()['size'] == 10
+        with open(job.file_path, 'rb') as f:
+            assert f.read() == b'a,b\r\n1,2\r\n'
+
+    def test_run_failed(self):
+        def chunks():
+            yield b'a,b\r\n'
+            raise ValueError('foo')
+
+        job = ExportJob.create(filename='export.csv', content_type='text/csv')
+        job.run(chunks())
+        assert job.get_status()['status'] == FAILED
+        assert job.get_status()['error'] == 'foo'
+
+    def test_queued(self):
+        job = ExportJob.create(filename='export.csv', content_type='text/csv')
+        assert ExportJob(job.id).get_status()['status'] == QUEUED
+
+    def test_interrupted(self):
+        job = ExportJob.create(filename='export.csv', content_type='text/csv')
+        # The process running the job is gone.
+        job.release()
+        status = ExportJob(job.id).get_status()
+        assert status['status'] == FAILED
+        assert status['error'] == 'The export was interrupted.'
+
+    def test_remove_expired(self):
+        job = ExportJob.create(filename='export.csv', content_type='text/csv')
+        job.set_status(created=time.time() - 3600)
+        with override_settings(FLEXIFORM_EXPORT_JOB_MAX_AGE=60):
+            ExportJobRunner.remove_expired()
+            assert job.get_status() is not None
+            job.release()
+            ExportJobRunner.remove_expired()
+        assert job.get_status() is None
+
+    def test_unknown_job(self):
+        assert ExportJob('0' * 32).get_status() is None
+
+    def test_runner_slot(self):
+        runner = ExportJobRunner()
+        with override_settings(FLEXIFORM_EXPORT_MAX_JOBS=1):
+            with runner.slot():
+                pass
+            with runner.slot():
+                pass
@@ -0,0 +1,75 @@
+from types import MethodType, SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+from django.core.paginator import EmptyPage, PageNotAnInteger
+from django.db.models import Q, QuerySet
+
+from ...pagination import (EstimatedCountPaginator, decode_cursor,
+                           encode_cursor, filter_after)
+
+
+class TestKeyset:
+
+    def test_cursor(self):
+        ordering = ('name', '-pk')
+        cursor = encode_cursor(SimpleNamespace(name='x', pk=3), ordering)
+        assert decode_cursor(cursor, ordering) == ['x', 3]
+
+    @pytest.mark.parametrize('cursor', ['foo', encode_cursor(SimpleNamespace(pk=1), ())])
+    def test_invalid_cursor(self, cursor):
+        with pytest.raises(ValueError):
+            decode_cursor(cursor, ('-pk', ))
+
+    def test_filter_after(self):
+        queryset = MagicMock()
+        filter_after(queryset, ('name', '-pk'), ['x', 3])
+        queryset.filter.assert_called_once_with(
+            Q(name__gt='x') | (Q(pk__lt=3) & Q(name='x')))
+        queryset.filter.return_value.order_by.assert_called_once_with(
+            'name', '-pk')
+
+
+class TestEstimatedCountPaginator:
+
+    @pytest.mark.parametrize('estimate, count', [
+        (50000, 50000),
+        (100, 120),
+        (None, 120),
+    ])
+    def test_count(self, estimate, count):
+        queryset = MagicMock(spec=QuerySet)
+        queryset.count = MethodType(lambda self: 120, queryset)
+        with patch('flexiform.pagination.get_estimated_count',
+                   return_value=estimate):
+            paginator = EstimatedCountPaginator(queryset, 10)
+            assert paginator.count == count
+            assert paginator.is_estimated == (count == 50000)
+
+    @pytest.fixture
+    def paginator(self):
+        # 33 rows, but the database estimates 10.
+        rows = list(range(33))
+        queryset = MagicMock(spec=QuerySet)
+        queryset.__getitem__.side_effect = lambda key: rows[key]
+        with patch('flexiform.pagination.get_estimated_count',
+                   return_value=10):
+            paginator = EstimatedCountPaginator(queryset, 10)
+            paginator.exact_count_limit = 5
+            assert paginator.count == 10
+            yield paginator
+
+    def test_pages_past_estimate(self, paginator):
+        assert list(paginator.page(1)) == list(range(10))
+        assert paginator.page(1).has_next()
+        assert list(paginator.page(3)) == list(range(20, 30))
+        page = paginator.page(4)
+        assert list(page) == [30, 31, 32]
+        assert not page.has_next()
+        assert paginator.num_pages == 4
+
+    def test_empty_page(self, paginator):
+        with pytest.raises(EmptyPage):
+            paginator.page(5)
+        with pytest.raises(PageNotAnInteger):
+            paginator.page('a')
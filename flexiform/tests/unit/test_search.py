@@ -0,0 +1,47 @@
+from unittest.mock import MagicMock
+
+import pytest
+from django.db.models import Q
+
+from ...search import get_search_text, is_searchable, update_search_text
+from ...views import AjaxSearchListView
+
+
+class TestSearchText:
+
+    @pytest.mark.parametrize('data, text', [
+        ({'a': {'name': 'Foo  Bar'}, 'b': {'city': 'Bern'}}, 'foo bar bern'),
+        ({'a': {'name': ''}}, ''),
+        ({'a': [{'name': 'X'}, {'name': 2}]}, 'x 2'),
+        ({'a': 'not a dict'}, ''),
+        ({}, ''),
+    ])
+    def test_get_search_text(self, data, text):
+        paths = [('a', 'name'), ('b', 'city')]
+        assert get_search_text(data, paths) == text
+
+    def test_update_search_text(self):
+        obj = MagicMock(
+            search_field='search_text', search_lookup_paths=[('a', 'name')],
+            data={'a': {'name': 'Foo'}})
+        update_search_text(obj)
+        assert obj.search_text == 'foo'
+
+    def test_is_searchable(self):
+        model = MagicMock(search_field=None)
+        assert not is_searchable(model)
+        model.search_field = 'search_text'
+        assert is_searchable(model)
+
+
+class TestAjaxSearchListView:
+
+    def test_search_field(self):
+        view = AjaxSearchListView()
+        view.model = MagicMock(
+            search_field='search_text', search_lookup_paths=[('a', 'name')])
+        view.request = MagicMock(GET={'term': 'Foo'})
+        view.get_queryset()
+        queryset = view.model._default_manager.all.return_value
+        queryset.filter.assert_called_once_with(
+            Q(search_text__contains='foo'))
@@ -2,8 +2,12 @@ from unittest.mock import MagicMock, sentinel
 
 import pytest
 
-from ...fields import JsonCharField
-from ...forms import BaseForm
+from django import forms
+from django.db import models
+from django.db.models import F
+
+from ...fields import JsonCharField, JsonChoiceField
+from ...forms import BaseForm, RepeatingRowField, get_promoted_value
 from ...json_structures import JsonStructure
 
 
@@ -36,3 +40,137 @@ class TestJsonStructure:
         # property is not callable, but __get__ does the trick.
         assert json_structure.model_class.someform_testfield.__get__(data_mock) == \
                sentinel.value
+
+    def test_row_extractor(self, json_structure):
+        extract = json_structure.get_row_extractor()
+        assert extract({'someform': {'testfield': sentinel.value}}) == \
+               [sentinel.value]
+        assert extract({'otherform': {}}) == [None]
+        assert extract(None) == ['']
+
+    def test_property_expressions(self, json_structure):
+        expressions = json_structure.get_property_expressions()
+        expression = expressions['someform_testfield']
+        assert expression.key_name == 'testfield'
+        assert expression.lhs.key_name == 'someform'
+
+    def test_to_columns(self, json_structure):
+        pytest.importorskip('numpy')
+        queryset = MagicMock()
+        queryset.values_list.return_value.iterator.return_value = [
+            ({'someform': {'testfield': 'foo'}}, ), (None, )]
+        columns = json_structure.to_columns(queryset=queryset)
+        queryset.values_list.assert_called_once_with('data')
+        assert columns['someform_testfield'].tolist() == ['foo', None]
+
+
+class TestCodebook:
+
+    @pytest.fixture(scope='class')
+    def json_structure(self):
+        class Form(BaseForm):
+            color = JsonChoiceField(
+                label='Color', choices=(('', '---'), ('r', 'Red')))
+
+            class Meta:
+                label = 'Section'
+                repeating_fields = [
+                    RepeatingRowField(name='rows', options={}, row={
+                        'size': (
+                            JsonChoiceField(label='Size', choices=(
+                                ('s', 'Small'), ('l', 'Large'))),
+                            forms.Select()),
+                    }),
+                ]
+
+        class Structure(JsonStructure):
+            form_list = (
+                ('someform', Form),
+            )
+
+        return Structure(MagicMock())
+
+    def test_codebook(self, json_structure):
+        rows = [
+            (e.section, e.question, e.option, e.code)
+            for e in json_structure.get_codebook('en')]
+        assert rows == [
+            ('Section', 'Color', 'Red', 'r'),
+            ('Section', 'Size', 'Small', 's'),
+            ('Section', 'Size', 'Large', 'l'),
+        ]
+        assert json_structure.get_codebook('en') is \
+               json_structure.get_codebook('en')
+
+    def test_choice_labels(self, json_structure):
+        assert json_structure.get_choice_labels('en') == {
+            ('someform', 'color', None): {'r': 'Red'},
+            ('someform', 'rows', 'size'): {'s': 'Small', 'l': 'Large'},
+        }
+
+    def test_definitions_from_keys(self, json_structure):
+        # The structure has no properties for the rows (empty table), the
+        # definitions of another process include two of them.
+        keys = [
+            ('someform_color', 'someform', 'color', None, None),
+            ('someform_rows_size_0', 'someform', 'rows', 'size', 0),
+            ('someform_rows_size_1', 'someform', 'rows', 'size', 1),
+        ]
+        definitions = json_structure.get_definitions(keys)
+        assert json_structure.get_definition_keys(definitions) == keys
+        extract = json_structure.get_row_extractor(definitions)
+        assert extract({'someform': {'color': 'r', 'rows': [{'size': 's'}]}}) \
+            == ['r', 's', '']
+
+    def test_no_scan(self, json_structure, monkeypatch):
+        monkeypatch.setattr(JsonStructure, 'scan_repeating_fields', False)
+        model = MagicMock()
+        structure = type(json_structure)(model)
+        model.objects.exclude.assert_not_called()
+        assert structure.properties == ['someform_color']
+
+
+class TestPromotedFields:
+
+    @pytest.fixture(scope='class')
+    def json_structure(self):
+        class Form(BaseForm):
+            status = JsonCharField()
+            name = JsonCharField()
+
+            class Meta:
+                promoted_fields = {'status': 'status_column'}
+
+        class Structure(JsonStructure):
+            form_list = (
+                ('someform', Form),
+            )
+
+        return Structure(MagicMock())
+
+    def test_lookup(self, json_structure):
+        assert json_structure.get_lookup('someform', 'status') == \
+               'status_column'
+        assert json_structure.get_lookup('someform', 'name') == \
+               'data__someform__name'
+
+    def test_property_expressions(self, json_structure):
+        expressions = json_structure.get_property_expressions()
+        assert expressions['someform_status'] == F('status_column')
+        assert expressions['someform_name'].key_name == 'name'
+
+    def test_promoted_code(self, json_structure):
+        json_structure.model_class._meta.get_field.return_value = \
+            models.IntegerField(null=True)
+        assert json_structure.get_promoted_code('someform', 'status', '3') == 3
+        assert json_structure.get_promoted_code(
+            'someform', 'status', 'x') == 'x'
+        assert json_structure.get_promoted_code('someform', 'name', '3') == '3'
+
+    @pytest.mark.parametrize('model_field, value, expected', [
+        (models.IntegerField(null=True), '12', 12),
+        (models.IntegerField(null=True), '', None),
+        (models.CharField(default=''), None, ''),
+    ])
+    def test_promoted_value(self, model_field, value, expected):
+        assert get_promoted_value(model_field, value) == expected
@@ -0,0 +1,80 @@
+from unittest.mock import MagicMock
+
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+
+from ...receivers import update_model_version
+from ...versioning import (bump_model_version, bump_object_version,
+                           check_shared_cache, get_model_version,
+                           get_object_last_modified, get_object_version)
+
+
+class TestModelVersion:
+
+    def test_version_is_stable(self):
+        model = MagicMock()
+        model._meta.label_lower = 'app.stable'
+        assert get_model_version(model) == get_model_version(model)
+
+    def test_bump(self):
+        model = MagicMock()
+        model._meta.label_lower = 'app.bumped'
+        version = get_model_version(model)
+        bump_model_version(model)
+        assert get_model_version(model) != version
+
+
+class TestObjectVersion:
+
+    @pytest.fixture
+    def model(self):
+        model = MagicMock()
+        model._meta.label_lower = 'app.objects'
+        return model
+
+    def test_bump_object(self, model):
+        version = get_object_version(model, 1)
+        other_version = get_object_version(model, 2)
+        bump_object_version(model, 1)
+        assert get_object_version(model, 1) != version
+        assert get_object_version(model, 2) == other_version
+        assert get_object_last_modified(model, 1) is not None
+
+    def test_bump_model(self, model):
+        version = get_object_version(model, 1)
+        bump_model_version(model, objects=False)
+        assert get_object_version(model, 1) == version
+        bump_model_version(model)
+        assert get_object_version(model, 1) != version
+
+
+class TestUpdateModelVersion:
+
+    def test_bump_on_commit(self, monkeypatch):
+        callbacks = []
+        monkeypatch.setattr(
+            'flexiform.receivers.transaction.on_commit',
+            lambda func, using=None: callbacks.append(func))
+        model = MagicMock()
+        model._meta.label_lower = 'app.committed'
+        version = get_model_version(model)
+        object_version = get_object_version(model, 1)
+
+        update_model_version(model, instance=MagicMock(pk=1), using='default')
+        assert get_model_version(model) == version
+
+        callbacks[0]()
+        assert get_model_version(model) != version
+        assert get_object_version(model, 1) != object_version
+
+
+class TestCheckSharedCache:
+
+    def test_local_memory(self):
+        with pytest.raises(ImproperlyConfigured):
+            check_shared_cache('cache_readonly_forms')
+
+    def test_shared(self, monkeypatch):
+        monkeypatch.setattr(
+            'flexiform.versioning.caches', {'default': MagicMock()})
+        check_shared_cache('cache_readonly_forms')
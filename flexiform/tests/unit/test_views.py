@@ -1,9 +1,28 @@
+import concurrent.futures
+import gzip
+import io
+import json
+import zipfile
+from collections import OrderedDict
 from unittest.mock import Mock, MagicMock, sentinel, call
 
 import pytest
+from django.db.models import QuerySet
+from django.forms import MultipleChoiceField
+from django.core.exceptions import ImproperlyConfigured
+from django.http import Http404, HttpResponse
+from django.views import View
 
 from ...forms import BaseForm
-from ...views import DownloadMixin, BaseFormMixin
+from ..models import Interview
+from ...json_structures import StructureProperty
+from ...jobs import ShardPool, setup_shard_process
+from ...exports import ExportFile
+from ...views import (AjaxSearchBatchMixin, AjaxSearchBatchView,
+                      AjaxSearchDetailView, BaseFormMixin, BaseFormViewMixin,
+                      ChartsView, ClustersView, CompressedDownloadMixin,
+                      ConditionalResponseMixin, DownloadMixin,
+                      export_shard, get_ranged_file_response)
 
 
 class TestDownloadMixin:
@@ -99,6 +118,599 @@ class TestDownloadMixin:
             [None, None, 'tazA', 'barA'],
             [None, None, None, None]]
 
+    def test_from_data_repeating_missing_key(self):
+        DownloadView = DownloadMixin()
+        DownloadView.queryset = [
+            Mock(data={'section1': {'section1a': [{'foo': 'bar'}]}}),
+            Mock(data={'section1': {'section1a': [{'faz': 'taz1'}, {'faz': 'taz2'}]}})]
+        data = DownloadView.from_data()
+        assert data == [
+            [
+                'section1_section1a_faz_0', 'section1_section1a_faz_1',
+                'section1_section1a_foo_0', 'section1_section1a_foo_1'],
+            [None, None, 'bar', None],
+            ['taz1', 'taz2', None, None]]
+
+    def test_iter_data_streams_rows(self):
+        DownloadView = DownloadMixin()
+        DownloadView.queryset = [Mock(data={'foo': 'bar'})]
+        rows = DownloadView.iter_data()
+        assert next(rows) == ['foo']
+        assert next(rows) == ['bar']
+
+    def test_iter_structure(self):
+        DownloadView = DownloadMixin()
+        DownloadView.model_fields = ['field1']
+        DownloadView.queryset = [Mock(field1='field 1', section1_foo='bar')]
+        structure = Mock(
+            properties=['section1_foo'],
+            property_definitions=[StructureProperty(
+                'section1_foo', 'section1', 'foo', None, None, None)])
+        rows = DownloadView.iter_structure(structure)
+        assert next(rows) == ['field1', 'section1_foo']
+        assert list(rows) == [['field 1', 'bar']]
+
+    def test_iter_zip(self):
+        DownloadView = DownloadMixin()
+        DownloadView.model_fields = ['id']
+        DownloadView.queryset = [Mock(pk=1, id=1, section1_foo='bar', data={
+            'section1': {'foo': 'bar', 'rows': [{'a': 'a0'}, {'a': 'a1'}]}})]
+        structure = Mock(property_definitions=[
+            StructureProperty('section1_foo', 'section1', 'foo', None, None, None),
+            StructureProperty('section1_rows_a_0', 'section1', 'rows', None, 'a', 0),
+        ])
+        repeating_field = Mock(row={'a': None})
+        repeating_field.name = 'rows'
+        structure.get_repeating_fields.return_value = [
+            ('section1', repeating_field)]
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(
+            DownloadView.iter_zip(structure))))
+        assert archive.namelist() == ['export.csv', 'section1_rows.csv']
+        assert archive.read('export.csv') == b'id,section1_foo\r\n1,bar\r\n'
+        assert archive.read('section1_rows.csv') == \
+            b'parent_id,index,a\r\n1,0,a0\r\n1,1,a1\r\n'
+
+    @pytest.mark.parametrize('pks, shard_size, pk_ranges', [
+        ([], 2, []),
+        ([1, 2, 3], 5, [(1, None)]),
+        ([1, 4, 5, 9, 12], 2, [(1, 5), (5, 12), (12, None)]),
+    ])
+    def test_get_pk_ranges(self, pks, shard_size, pk_ranges):
+        assert DownloadMixin.get_pk_ranges(iter(pks), shard_size) == pk_ranges
+
+
+class TestShardedExport:
+
+    class Executor:
+        """
+        Run the submitted shards in reverse order, once the first result is
+        requested.
+        """
+        def __init__(self, **kwargs):
+            self.kwargs = kwargs
+            self.calls = []
+            TestShardedExport.executor = self
+
+        def submit(self, fn, *args):
+            executor = self
+
+            class Future(concurrent.futures.Future):
+                def result(self, timeout=None):
+                    executor.run()
+                    return super().result(timeout)
+
+            future = Future()
+            self.calls.append((future, fn, args))
+            return future
+
+        def run(self):
+            for future, fn, args in reversed(self.calls):
+                if not future.done():
+                    future.set_result(fn(*args))
+
+        def shutdown(self, wait=True):
+            pass
+
+    def test_export_shard(self, tmp_path, monkeypatch):
+        monkeypatch.setattr('flexiform.views.connections', MagicMock())
+        model = MagicMock()
+        del model._meta.structure
+
+        class View(DownloadMixin):
+            pass
+
+        View.model = model
+        View.from_key_columns = Mock(return_value=[[1, 'a'], [2, 'b']])
+        path = str(tmp_path / '0.csv')
+        assert export_shard(
+            View, ['id'], sentinel.query, (1, 3), OrderedDict(), None,
+            path) == path
+        with open(path) as f:
+            assert f.read() == '1,a\n2,b\n'
+        queryset = model._default_manager.all.return_value
+        assert queryset.query == sentinel.query
+        queryset.filter.assert_called_once_with(pk__gte=1)
+        queryset.filter.return_value.filter.assert_called_once_with(pk__lt=3)
+
+    def test_export_shard_definitions(self, tmp_path, monkeypatch):
+        monkeypatch.setattr('flexiform.views.connections', MagicMock())
+        structure = MagicMock()
+        structure.get_definitions.return_value = sentinel.definitions
+
+        class View(DownloadMixin):
+            model = MagicMock()
+            get_structure = Mock(return_value=structure)
+            from_structure = Mock(return_value=[[1, 'r']])
+
+        path = str(tmp_path / '0.csv')
+        export_shard(View, ['id'], sentinel.query, (1, None), None,
+                     sentinel.keys, path)
+        structure.get_definitions.assert_called_once_with(sentinel.keys)
+        assert View.from_structure.call_args[1]['definitions'] == \
+            sentinel.definitions
+        with open(path) as f:
+            assert f.read() == '1,r\n'
+
+    def test_shard_order(self, tmp_path, monkeypatch, settings):
+        settings.FLEXIFORM_EXPORT_ROOT = str(tmp_path)
+        monkeypatch.setattr(
+            'flexiform.jobs.concurrent.futures.ProcessPoolExecutor',
+            self.Executor)
+        monkeypatch.setattr('flexiform.views.shard_pool', ShardPool())
+
+        def export_shard(view_class, model_fields, query, pk_range,
+                         key_columns, definition_keys, path, labels,
+                         label_language):
+            with open(path, 'w') as f:
+                f.write(f'{pk_range[0]}\r\n')
+            return path
+
+        monkeypatch.setattr('flexiform.views.export_shard', export_shard)
+        view = DownloadMixin()
+        view.model = MagicMock()
+        del view.model._meta.structure
+        view.export_processes = 2
+        view.get_export_queryset = MagicMock()
+        view.get_key_columns = Mock(return_value=OrderedDict())
+        view.get_data_header = Mock(return_value=['id'])
+        view.get_pk_ranges = Mock(return_value=[(1, 3), (3, 5), (5, None)])
+
+        assert b''.join(view.iter_sharded_csv()) == b'id\r\n1\r\n3\r\n5\r\n'
+        assert self.executor.kwargs['mp_context'].get_start_method() == \
+            'spawn'
+        assert self.executor.kwargs['initializer'] is setup_shard_process
+
+        # The pool is kept for the next export.
+        executor = self.executor
+        assert b''.join(view.iter_sharded_csv()) == b'id\r\n1\r\n3\r\n5\r\n'
+        assert self.executor is executor
+
+
+class TestCompressedDownloadMixin:
+
+    @pytest.fixture
+    def view(self):
+        view = CompressedDownloadMixin()
+        view.compress_responses = True
+        view.kwargs = {}
+        view.request = MagicMock(META={})
+        return view
+
+    @pytest.mark.parametrize('accept_encoding, content_type, expected', [
+        ('gzip, deflate', 'text/csv', 'gzip'),
+        ('gzip;q=0, deflate', 'text/csv', None),
+        ('', 'text/csv', None),
+        ('gzip', 'application/zip', None),
+    ])
+    def test_get_content_encoding(self, view, accept_encoding, content_type,
+                                  expected):
+        view.request.META['HTTP_ACCEPT_ENCODING'] = accept_encoding
+        export_file = ExportFile([], 'export.csv', content_type)
+        assert view.get_content_encoding(export_file) == expected
+
+    def test_compress_export_file(self, view):
+        view.kwargs['extension'] = 'csv.gz'
+        export_file = view.compress_export_file(
+            ExportFile([b'a'], 'export.csv', 'text/csv'))
+        assert export_file.filename == 'export.csv.gz'
+        assert export_file.content_type == 'application/gzip'
+
+    @pytest.mark.parametrize('content_type', [
+        'application/vnd.apache.parquet', 'application/vnd.apache.arrow.stream',
+        'application/zip',
+    ])
+    def test_compress_compressed_file(self, view, content_type):
+        view.kwargs['extension'] = 'csv.gz'
+        with pytest.raises(Http404):
+            view.compress_export_file(
+                ExportFile([b'a'], 'export.parquet', content_type))
+
+    def test_encode_export_file(self, view):
+        view.request.META['HTTP_ACCEPT_ENCODING'] = 'gzip'
+        export_file, content_encoding = view.encode_export_file(
+            ExportFile([b'a'], 'export.csv', 'text/csv'))
+        assert content_encoding == 'gzip'
+        response = view.get_file_response(export_file, content_encoding)
+        assert response['Content-Encoding'] == 'gzip'
+        assert response['Vary'] == 'Accept-Encoding'
+        assert gzip.decompress(b''.join(response.streaming_content)) == b'a'
+
+    def test_compression_in_etag(self, rf):
+        class TestView(DownloadMixin):
+            conditional_responses = True
+            compress_responses = True
+            get = Mock(return_value=HttpResponse('content'))
+
+            def get_data_version(self):
+                return 'v1'
+
+            def get_last_modified(self):
+                return None
+
+        etag = TestView.as_view()(rf.get('/'))['ETag']
+        response = TestView.as_view()(
+            rf.get('/', HTTP_IF_NONE_MATCH=etag))
+        assert response.status_code == 304
+        assert response['Vary'] == 'Accept-Encoding'
+        response = TestView.as_view()(rf.get(
+            '/', HTTP_IF_NONE_MATCH=etag, HTTP_ACCEPT_ENCODING='gzip'))
+        assert response.status_code == 200
+
+
+class TestGeoJSONExport:
+
+    @pytest.fixture
+    def view(self):
+        view = DownloadMixin()
+        view.request = MagicMock(GET={})
+        view.model = MagicMock()
+        view.get_structure = MagicMock(return_value=None)
+        return view
+
+    @pytest.mark.parametrize('params, extent', [
+        ({'bbox': '7,46,8,47'}, (7, 46, 8, 47)),
+        ({'polygon': 'POLYGON((0 0, 0 1, 1 1, 0 0))'}, (0, 0, 1, 1)),
+    ])
+    def test_spatial_filter(self, view, params, extent):
+        view.request.GET = params
+        geometry = view.get_spatial_filter()
+        assert geometry.extent == extent
+        assert geometry.srid == 4326
+
+    @pytest.mark.parametrize('params', [
+        {'bbox': '7,46'}, {'bbox': 'a,b,c,d'}, {'polygon': 'foo'},
+    ])
+    def test_invalid_spatial_filter(self, view, params):
+        view.request.GET = params
+        with pytest.raises(Http404):
+            view.get_spatial_filter()
+
+    def test_iter_geojson(self, view):
+        view.model_fields = []
+        view.get_geometry_field = MagicMock(return_value=MagicMock(srid=4326))
+        view.get_download_queryset = MagicMock()
+        view.get_iterator = MagicMock(return_value=iter([
+            (1, '{"type": "Point", "coordinates": [7.5, 46.5]}', {'a': 1}),
+            (2, None, None),
+        ]))
+        collection = json.loads(b''.join(view.iter_geojson()))
+        assert collection['features'] == [
+            {'type': 'Feature', 'id': 1,
+             'geometry': {'type': 'Point', 'coordinates': [7.5, 46.5]},
+             'properties': {'data': {'a': 1}}},
+            {'type': 'Feature', 'id': 2, 'geometry': None,
+             'properties': {'data': None}},
+        ]
+
+
+class TestClustersView:
+
+    @pytest.fixture
+    def view(self):
+        view = ClustersView()
+        view.request = MagicMock(GET={})
+        return view
+
+    @pytest.mark.parametrize('params, grid_size', [
+        ({}, 45),
+        ({'zoom': '2'}, 11.25),
+        ({'zoom': '2', 'grid': '0.5'}, 0.5),
+    ])
+    def test_grid_size(self, view, params, grid_size):
+        view.request.GET = params
+        assert view.get_grid_size() == grid_size
+
+    @pytest.mark.parametrize('params', [{'zoom': 'a'}, {'grid': '0'}])
+    def test_invalid_grid_size(self, view, params):
+        view.request.GET = params
+        with pytest.raises(Http404):
+            view.get_grid_size()
+
+    def test_get(self, view):
+        view.get_clusters = MagicMock(return_value=[(Mock(x=7, y=46), 3)])
+        response = view.get(view.request)
+        assert json.loads(response.content)['features'] == [{
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [7, 46]},
+            'properties': {'count': 3},
+        }]
+
+
+class TestLabels:
+
+    @pytest.fixture
+    def view(self):
+        view = DownloadMixin()
+        view.model_fields = ['id']
+        view.label_language = 'en'
+        return view
+
+    @pytest.fixture
+    def structure(self):
+        structure = MagicMock()
+        structure.get_choice_labels.return_value = {
+            ('section', 'color', None): {'r': 'Red', 'g': 'Green'}}
+        structure.get_form_field.side_effect = lambda d: d.field
+        return structure
+
+    @pytest.fixture
+    def definitions(self):
+        return [
+            StructureProperty(
+                name='section_name', keyword='section', field_name='name',
+                field=Mock(), row_key=None, index=None),
+            StructureProperty(
+                name='section_color', keyword='section', field_name='color',
+                field=MultipleChoiceField(), row_key=None, index=None),
+        ]
+
+    @pytest.mark.parametrize('labels, header, row', [
+        ('replace', ['id', 'section_name', 'section_color'],
+         [1, 'foo', 'Red,Green']),
+        ('append', ['id', 'section_name', 'section_color',
+                    'section_color_label'],
+         [1, 'foo', 'r,g', 'Red,Green']),
+    ])
+    def test_from_structure(self, view, structure, definitions, labels,
+                            header, row):
+        view.labels = labels
+        view.from_structure_objects = Mock(return_value=[[1, 'foo', 'r,g']])
+        assert view.get_structure_header(structure, definitions) == header
+        assert list(view.from_structure(
+            structure, definitions, queryset=[])) == [row]
+
+    def test_get_label(self):
+        labels = {'r': 'Red', '1': 'One'}
+        assert DownloadMixin.get_label('r', labels, False) == 'Red'
+        assert DownloadMixin.get_label(1, labels, False) == 'One'
+        assert DownloadMixin.get_label('x', labels, False) == 'x'
+        assert DownloadMixin.get_label('', labels, False) == ''
+
+
+class TestAjaxSearchBatchView:
+
+    @pytest.fixture
+    def view(self):
+        view = AjaxSearchBatchView()
+        view.model = Interview
+        view.request = MagicMock(GET={})
+        view.json_mapping = lambda obj: obj.name
+        return view
+
+    def test_request_order(self, view, db_rows):
+        view.request.GET = {'ids': '3,1,2'}
+        db_rows.rows = [{'id': 1, 'name': 'one'}, {'id': 3, 'name': 'three'}]
+        assert list(view.get_json_data()) == ['three', 'one']
+        sql, params = db_rows.queries[0]
+        assert sorted(params) == [1, 2, 3]
+
+    def test_composed_with_detail_view(self, rf, db_rows):
+        # As the default search/batch/ route: no pk in the URL.
+        view_class = type(
+            'SearchDetailViewBatch',
+            (AjaxSearchBatchMixin, AjaxSearchDetailView), {})
+        db_rows.rows = [{'id': 1, 'name': 'one'}]
+        view = view_class.as_view(
+            model=Interview, json_mapping=lambda obj: {'value': obj.pk},
+            conditional_responses=True)
+        request = rf.get(
+            '/?ids=1,2', HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        response = view(request)
+        assert response.status_code == 200
+        assert json.loads(response.content) == [{'value': 1}]
+        assert response['ETag']
+
+    def test_invalid_ids(self, view):
+        view.request.GET = {'ids': '1,a'}
+        with pytest.raises(Http404):
+            view.get_queryset()
+
+
+class TestProjectedSearch:
+
+    class DetailView(AjaxSearchDetailView):
+        model = Interview
+        mapping_fields = ('name',)
+        mapping_paths = {'color': ('interviewee', 'color')}
+
+        def json_mapping(self, obj):
+            return {'value': obj.pk, 'name': obj.name, 'color': obj.color}
+
+    @staticmethod
+    def get(view_class, rf, path, **kwargs):
+        request = rf.get(path, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        return json.loads(view_class.as_view()(request, **kwargs).content)
+
+    def test_not_declared(self):
+        queryset = MagicMock(spec=QuerySet)
+        assert AjaxSearchBatchView().get_projected_queryset(
+            queryset) is queryset
+
+    def test_detail(self, rf, db_rows):
+        db_rows.rows = [{'id': 1, 'name': 'a', 'color': 'red'}]
+        assert self.get(self.DetailView, rf, '/', pk=1) == [
+            {'value': 1, 'name': 'a', 'color': 'red'}]
+        # Only the declared values are loaded, not the whole data.
+        assert db_rows.columns == [['id', 'name', 'color']]
+        sql, params = db_rows.queries[0]
+        assert '"flexiform_interview"."data" #>> %s) AS "color"' in sql
+        assert 'WHERE "flexiform_interview"."id" = %s' in sql
+
+    def test_detail_not_found(self, rf, db_rows):
+        with pytest.raises(Http404):
+            self.get(self.DetailView, rf, '/', pk=1)
+
+    def test_batch(self, rf, db_rows):
+        view_class = type(
+            'DetailViewBatch', (AjaxSearchBatchMixin, self.DetailView), {})
+        db_rows.rows = [
+            {'id': 3, 'name': 'c', 'color': 'blue'},
+            {'id': 1, 'name': 'a', 'color': 'red'},
+        ]
+        assert self.get(view_class, rf, '/?ids=1,2,3') == [
+            {'value': 1, 'name': 'a', 'color': 'red'},
+            {'value': 3, 'name': 'c', 'color': 'blue'},
+        ]
+        assert db_rows.columns == [['id', 'name', 'color']]
+
+
+class TestConditionalResponseMixin:
+
+    @pytest.fixture
+    def view_class(self):
+        class TestView(ConditionalResponseMixin, View):
+            conditional_responses = True
+            version = 'v1'
+            get = Mock(return_value=HttpResponse('content'))
+
+            def get_data_version(self):
+                return self.version
+        return TestView
+
+    def test_etag(self, rf, view_class):
+        response = view_class.as_view()(rf.get('/'))
+        assert response.status_code == 200
+        assert response['ETag']
+
+    def test_not_modified(self, rf, view_class):
+        etag = view_class.as_view()(rf.get('/'))['ETag']
+        view_class.get.reset_mock()
+        response = view_class.as_view()(
+            rf.get('/', HTTP_IF_NONE_MATCH=etag))
+        assert response.status_code == 304
+        view_class.get.assert_not_called()
+
+    def test_changed(self, rf, view_class):
+        etag = view_class.as_view()(rf.get('/'))['ETag']
+        response = view_class.as_view(version='v2')(
+            rf.get('/', HTTP_IF_NONE_MATCH=etag))
+        assert response.status_code == 200
+
+    def test_url(self, rf, view_class):
+        etag = view_class.as_view()(rf.get('/'))['ETag']
+        response = view_class.as_view()(
+            rf.get('/?page=2', HTTP_IF_NONE_MATCH=etag))
+        assert response.status_code == 200
+
+    def test_disabled_by_default(self, rf, view_class):
+        response = view_class.as_view(conditional_responses=False)(
+            rf.get('/'))
+        assert not ConditionalResponseMixin.conditional_responses
+        assert not response.has_header('ETag')
+
+    def test_no_version(self, rf, view_class):
+        response = view_class.as_view(version=None)(rf.get('/'))
+        assert not response.has_header('ETag')
+
+
+class TestBaseFormViewMixin:
+
+    @pytest.fixture
+    def view(self):
+        class Model:
+            _default_manager = MagicMock()
+
+        def get_form(lookups):
+            class Form:
+                class Meta:
+                    model = Model
+                get_related_lookups = Mock(return_value=lookups)
+            return Form
+
+        view = BaseFormViewMixin()
+        view.kwargs = {'pk': 1}
+        view.routing_object_class = Model
+        view.form_list = [
+            ('a', get_form((['country'], ['links']))),
+            ('b', get_form(([], ['links', 'orgs']))),
+        ]
+        return view
+
+    def test_routing_queryset(self, view):
+        manager = view.routing_object_class._default_manager
+        queryset = view.get_routing_queryset()
+        manager.select_related.assert_called_once_with('country')
+        manager.select_related.return_value.prefetch_related.\
+            assert_called_once_with('links', 'orgs')
+        assert queryset == manager.select_related.return_value.\
+            prefetch_related.return_value
+
+    def test_render_cache_key(self, view):
+        view.routing_object_class._meta = MagicMock(label_lower='app.model')
+        key = view.get_render_cache_key('a', 'v1')
+        assert key == view.get_render_cache_key('a', 'v1')
+        assert key != view.get_render_cache_key('b', 'v1')
+        assert key != view.get_render_cache_key('a', 'v2')
+
+    def test_cache_readonly_forms_local_cache(self, view):
+        view.cache_readonly_forms = True
+        with pytest.raises(ImproperlyConfigured):
+            view.get_readonly_forms()
+
+    def test_single_fetch(self, view, monkeypatch):
+        view.get_routing_queryset = Mock(return_value=sentinel.queryset)
+        mock_get_object = Mock(return_value=sentinel.object)
+        monkeypatch.setattr(
+            'flexiform.views.get_object_or_404', mock_get_object)
+        assert view.get_object(form=None) == sentinel.object
+        assert view.get_object(form=None) == sentinel.object
+        mock_get_object.assert_called_once_with(sentinel.queryset, id=1)
+
+
+class TestRangedFileResponse:
+
+    @pytest.fixture
+    def path(self, tmp_path):
+        path = tmp_path / 'export.csv'
+        path.write_bytes(b'0123456789')
+        return str(path)
+
+    def test_full(self, rf, path):
+        response = get_ranged_file_response(
+            rf.get('/'), path, 'export.csv', 'text/csv')
+        assert response.status_code == 200
+        assert response['Accept-Ranges'] == 'bytes'
+        assert b''.join(response.streaming_content) == b'0123456789'
+
+    @pytest.mark.parametrize('range_header, content, content_range', [
+        ('bytes=2-4', b'234', 'bytes 2-4/10'),
+        ('bytes=7-', b'789', 'bytes 7-9/10'),
+        ('bytes=-2', b'89', 'bytes 8-9/10'),
+    ])
+    def test_range(self, rf, path, range_header, content, content_range):
+        response = get_ranged_file_response(
+            rf.get('/', HTTP_RANGE=range_header), path, 'export.csv',
+            'text/csv')
+        assert response.status_code == 206
+        assert response['Content-Range'] == content_range
+        assert b''.join(response.streaming_content) == content
+
+    def test_range_not_satisfiable(self, rf, path):
+        response = get_ranged_file_response(
+            rf.get('/', HTTP_RANGE='bytes=10-'), path, 'export.csv',
+            'text/csv')
+        assert response.status_code == 416
+
 
 class TestBaseFormMixin:
 
@@ -194,3 +806,41 @@ class TestBaseFormMixin:
         view.get_form_initial(step='test')
 
         assert call.from_model(instance=sentinel.object) in form.method_calls
+
+
+class TestPromotedCodes:
+
+    @pytest.fixture
+    def structure(self):
+        structure = MagicMock()
+        structure.get_promoted_code.side_effect = \
+            lambda keyword, name, code: int(code)
+        return structure
+
+    def test_chart_data(self, structure, settings):
+        settings.CORE_TOPICS = [('a', 'Topic A')]
+        settings.CORE_TOPIC_COLORS = [('a', 'red')]
+        view = ChartsView()
+        view.model = MagicMock()
+        view.model._meta.structure = structure
+        view.section_keyword, view.question_keyword = 'section', 'size'
+        view.question = MagicMock(
+            choices=[(None, '---'), ('1', 'S'), ('2', 'L')])
+        view.topics = None
+        # Promoted values are read as integers.
+        view.get_aggregated_data = Mock(return_value={'a': {1: 4, 2: 5}})
+        assert view.get_chart_data()['values'][0]['data'] == [4, 5]
+        structure.get_promoted_code.assert_any_call('section', 'size', '1')
+
+    def test_label_columns(self, structure):
+        view = DownloadMixin()
+        view.labels = 'replace'
+        view.label_language = 'en'
+        structure.get_choice_labels.return_value = {
+            ('section', 'size', None): {'1': 'S'}}
+        definition = StructureProperty(
+            'section_size', 'section', 'size', None, None, None)
+        [(i, labels, multiple)] = view.get_label_columns(
+            structure, [definition])
+        assert view.get_label(1, labels, multiple) == 'S'
+        assert view.get_label('1', labels, multiple) == 'S'
@@ -5,6 +5,9 @@ from django.conf.urls import include, url
 from django.utils.module_loading import import_string
 from django.views import View
 
+from .views import (AjaxSearchBatchMixin, ExportJobFileView,
+                    ExportJobStatusView)
+
 
 logger = logging.getLogger(__name__)
 
@@ -17,11 +20,13 @@ class DefaultPatterns:
 
     def __init__(
             self, app_name: str, include_search: bool=False,
-            include_charts: bool=False, include_download: bool=False):
+            include_charts: bool=False, include_download: bool=False,
+            include_clusters: bool=False):
         self.app_name = app_name
         self.include_search = include_search
         self.include_charts = include_charts
         self.include_download = include_download
+        self.include_clusters = include_clusters
         self.views = import_module(f'{app_name}.views')
         self.model = import_string(f'{app_name}.models.{app_name.title()}')
         if not self.views:
@@ -32,6 +37,15 @@ class DefaultPatterns:
     def _get_view(self, view_name: str) -> View:
         return getattr(self.views, f'{self.app_name.title()}{view_name}')
 
+    def _get_optional_view(self, view_name: str, default: View) -> View:
+        """
+        Return the view of the app if it is defined, else the default view.
+        """
+        try:
+            return self._get_view(view_name)
+        except AttributeError:
+            return default
+
     @property
     def detail_view(self):
         return self._get_view('DetailView').as_view()
@@ -67,10 +81,28 @@ class DefaultPatterns:
     def search_detail_view(self):
         return self._get_view('SearchDetailView').as_view()
 
+    @property
+    def search_batch_view(self):
+        """
+        Use the SearchBatchView of the app if defined, else the app's
+        SearchDetailView (with its json_mapping) for many IDs.
+        """
+        try:
+            return self._get_view('SearchBatchView').as_view()
+        except AttributeError:
+            detail_view = self._get_view('SearchDetailView')
+            return type(
+                f'{detail_view.__name__}Batch',
+                (AjaxSearchBatchMixin, detail_view), {}).as_view()
+
     @property
     def charts_view(self):
         return self._get_view('ChartsView').as_view()
 
+    @property
+    def clusters_view(self):
+        return self._get_view('ClustersView').as_view()
+
     @property
     def download_view(self):
         return self._get_view('DownloadView').as_view()
@@ -79,6 +111,16 @@ class DefaultPatterns:
     def codes_download_view(self):
         return self._get_view('DownloadCodesView').as_view()
 
+    @property
+    def download_job_view(self):
+        return self._get_optional_view(
+            'DownloadJobView', ExportJobStatusView).as_view()
+
+    @property
+    def download_job_file_view(self):
+        return self._get_optional_view(
+            'DownloadJobFileView', ExportJobFileView).as_view()
+
     def get_patterns(self) -> tuple:
         patterns = (
             url(r'^$', self.list_view, name='list'),
@@ -95,15 +137,30 @@ class DefaultPatterns:
                 url(r'^search/$', self.search_view, name='search_list'),
                 url(r'^search/(?P<pk>\d+)/$',
                     self.search_detail_view, name='search_detail'),
+                url(r'^search/batch/$',
+                    self.search_batch_view, name='search_batch'),
             )
         if self.include_charts is True:
             patterns += (
                 url(r'^charts/$', self.charts_view, name='charts'),
             )
+        if self.include_clusters is True:
+            patterns += (
+                url(r'^clusters/$', self.clusters_view, name='clusters'),
+            )
         if self.include_download is True:
             patterns += (
                 url(r'^download/$', self.download_view, name='download'),
                 url(r'^codes/$', self.codes_download_view,
                     name='download_codes'),
+                url(r'^download\.(?P<extension>csv\.gz|csv\.zst)$',
+                    self.download_view, name='download_compressed'),
+                url(r'^codes\.(?P<extension>csv\.gz|csv\.zst)$',
+                    self.codes_download_view,
+                    name='download_codes_compressed'),
+                url(r'^download/jobs/(?P<job_id>[0-9a-f]{32})/$',
+                    self.download_job_view, name='download_job'),
+                url(r'^download/jobs/(?P<job_id>[0-9a-f]{32})/file/$',
+                    self.download_job_file_view, name='download_job_file'),
             )
         return patterns
@@ -0,0 +1,125 @@
+import uuid
+
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.utils import timezone
+
+from .conf import settings
+
+
+def _get_model_version_key(model) -> str:
+    return f'flexiform:version:{model._meta.label_lower}'
+
+
+def _get_generation_key(model) -> str:
+    return f'flexiform:generation:{model._meta.label_lower}'
+
+
+def _get_object_version_key(model, pk) -> str:
+    return f'flexiform:version:{model._meta.label_lower}:' \
+           f'{_get_version(_get_generation_key(model))}:{pk}'
+
+
+def _get_version(key: str) -> str:
+    cache = caches[settings.FLEXIFORM_CACHE]
+    version = cache.get(key)
+    if version is None:
+        # The token is unknown (e.g. the cache was cleared), start a new one.
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def _bump_version(key: str) -> None:
+    """
+    Set a new token, along with the time of the change (used as
+    Last-Modified).
+    """
+    caches[settings.FLEXIFORM_CACHE].set_many({
+        key: uuid.uuid4().hex,
+        f'{key}:modified': timezone.now(),
+    }, None)
+
+
+def get_model_version(model) -> str:
+    """
+    Return the current data version of a model: a token which changes every
+    time an object of the model is saved or deleted. The token is kept in the
+    FLEXIFORM_CACHE, which must be shared by all processes (e.g. memcached).
+    """
+    return _get_version(_get_model_version_key(model))
+
+
+def get_model_last_modified(model):
+    """
+    Return the time of the last change of the model's data, or None if it is
+    unknown.
+    """
+    return caches[settings.FLEXIFORM_CACHE].get(
+        f'{_get_model_version_key(model)}:modified')
+
+
+def bump_model_version(model, objects: bool=True) -> None:
+    """
+    Change the data version of a model. This happens automatically when
+    objects are saved or deleted, but needs to be called after bulk
+    operations which do not send signals (e.g. QuerySet.update).
+
+    :param objects: bool. Whether to change the versions of all objects of the
+        model as well (starting a new generation of object versions).
+    """
+    _bump_version(_get_model_version_key(model))
+    if objects:
+        _bump_version(_get_generation_key(model))
+
+
+def get_object_version(model, pk) -> str:
+    """
+    Return the current data version of a single object, which changes every
+    time the object is saved or deleted (and with bump_model_version). The
+    object does not need to be loaded.
+    """
+    return _get_version(_get_object_version_key(model, pk))
+
+
+def get_object_last_modified(model, pk):
+    """
+    Return the time of the last change of the object, or None if it is
+    unknown.
+    """
+    return caches[settings.FLEXIFORM_CACHE].get(
+        f'{_get_object_version_key(model, pk)}:modified')
+
+
+def bump_object_version(model, pk) -> None:
+    """
+    Change the data version of a single object.
+    """
+    _bump_version(_get_object_version_key(model, pk))
+
+
+def is_versioned(model) -> bool:
+    """
+    Only models storing data in a "data" field are versioned.
+    """
+    try:
+        model._meta.get_field('data')
+    except (AttributeError, FieldDoesNotExist):
+        return False
+    return True
+
+
+def check_shared_cache(feature: str) -> None:
+    """
+    Raise ImproperlyConfigured if the FLEXIFORM_CACHE is kept per process
+    (local-memory cache): the versions would only change in the process
+    handling a save, the other processes keep serving outdated data.
+
+    :param feature: str. The name of the option requiring the cache, for the
+        error message.
+    """
+    if isinstance(caches[settings.FLEXIFORM_CACHE], LocMemCache):
+        raise ImproperlyConfigured(
+            f'{feature} requires a FLEXIFORM_CACHE shared by all processes '
+            f'(e.g. memcached or redis), not the local-memory cache.')
@@ -1,32 +1,143 @@
 import csv
+import hashlib
 import itertools
 import json
+import os
+import re
+import shutil
 import uuid
-from collections import OrderedDict, defaultdict
+from collections import OrderedDict
+from types import SimpleNamespace
 from unittest.mock import Mock
 
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.contrib.gis.geos import Point
-from django.core.exceptions import FieldDoesNotExist
-from django.db.models import F, Model, Q, QuerySet
-from django.forms import Media
-from django.http import (Http404, HttpResponseRedirect, JsonResponse,
-                         StreamingHttpResponse)
+from django.contrib.gis.db.models import Collect, GeometryField
+from django.contrib.gis.db.models.functions import (AsGeoJSON, Centroid,
+                                                    SnapToGrid, Transform)
+from django.contrib.gis.gdal import GDALException
+from django.contrib.gis.geos import GEOSException, GEOSGeometry, Point, Polygon
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db import connections
+from django.db.models import Count, F, Model, Q, QuerySet
+from django.forms import Media, MultipleChoiceField
+from django.http import (Http404, HttpResponse, HttpResponseRedirect,
+                         JsonResponse, StreamingHttpResponse)
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
+from django.utils import translation
+from django.utils.http import http_date, quote_etag
+from django.utils.cache import get_conditional_response, patch_vary_headers
 from django.utils.translation import ugettext_lazy as _
 from django.views import View
 from django.views.generic import ListView, TemplateView
 from django.views.generic.list import MultipleObjectMixin
 from formtools.wizard.views import NamedUrlWizardView
 
+from .changes import get_changes, get_cursor, is_tracked
 from .fields import JsonChoiceField
 from .formsets import BaseFlexiFormSet
+from .fragments import get_fragment_key
 from .forms import BaseForm, ChainDict
-from .json_structures import JsonStructure
+from .jobs import DONE, ExportJob, export_jobs, shard_pool
+from .json_structures import (JsonStructure, StructureProperty,
+                              get_key_text_transform)
+from .pagination import EstimatedCountPaginator, get_keyset_page
+from .search import is_searchable
+from .versioning import (check_shared_cache, get_model_last_modified,
+                         get_model_version, get_object_last_modified,
+                         get_object_version, is_versioned)
 
 from .conf import settings
+from .exports import (COMPRESSIONS, STRING, CachedExport, ExportFile,
+                      ZipStream, get_model_field_type, get_pyarrow,
+                      get_zstandard, iter_columnar, iter_compressed)
+
+
+class ConditionalResponseMixin:
+    """
+    Answer conditional requests (If-None-Match, If-Modified-Since) with 304
+    Not Modified while the data of the view did not change, before anything
+    is queried or rendered. The ETag is built from the data version
+    (get_data_version) and what else the response depends on: the URL, the
+    language and the user.
+
+    Set conditional_responses to enable this, only if FLEXIFORM_CACHE is
+    shared by all processes: with a per-process cache (e.g. the default
+    local-memory cache), the versions of the other processes do not change
+    and they keep answering 304.
+    """
+    conditional_responses = False
+
+    def get_data_version(self) -> str or None:
+        """
+        Return the version of the data shown by the view, or None to always
+        respond normally.
+        """
+        return None
+
+    def get_last_modified(self):
+        """
+        Return the time of the last change of the data shown, or None if it
+        is unknown.
+        """
+        return None
+
+    def get_etag_key_parts(self) -> list:
+        """
+        Return what the response depends on besides the data version.
+        """
+        user = getattr(self.request, 'user', None)
+        return [self.request.get_full_path(), translation.get_language(),
+                getattr(user, 'pk', None)]
+
+    def get_etag(self) -> str or None:
+        version = self.get_data_version()
+        if version is None:
+            return None
+        key_parts = [version] + self.get_etag_key_parts()
+        return quote_etag(hashlib.sha1(repr(key_parts).encode()).hexdigest())
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.conditional_responses or \
+                request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+
+        etag = self.get_etag()
+        if etag is None:
+            return super().dispatch(request, *args, **kwargs)
+        last_modified = self.get_last_modified()
+        if last_modified is not None:
+            last_modified = int(last_modified.timestamp())
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            return response
+
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200:
+            if not response.has_header('ETag'):
+                response['ETag'] = etag
+            if last_modified is not None and \
+                    not response.has_header('Last-Modified'):
+                response['Last-Modified'] = http_date(last_modified)
+        return response
+
+
+class ModelVersionMixin(ConditionalResponseMixin):
+    """
+    Use the data version of the view's model for conditional responses.
+    """
+
+    def get_data_version(self) -> str or None:
+        if not is_versioned(self.model):
+            return None
+        return get_model_version(self.model)
+
+    def get_last_modified(self):
+        return get_model_last_modified(self.model)
 
 
 class RetrieveMixin:
@@ -221,28 +332,72 @@ class BaseFormMixin(LoginRequiredMixin, RetrieveMixin, NamedUrlWizardView):
             yield (keyword, label)
 
 
-class AjaxSearchThroughMixin(MultipleObjectMixin):
+class AjaxSearchThroughMixin(ModelVersionMixin, MultipleObjectMixin):
+    # Set the (unique) ordering, e.g. ('-pk', ), to request the objects after
+    # the last result with ?after=<cursor>. The cursor of the next results is
+    # returned in the header X-Next-Cursor.
+    keyset_ordering = None
+    next_cursor = None
+    # Declare the values needed by json_mapping to load only these instead of
+    # the model instances with all their data: model fields (mapping_fields)
+    # and values of the JSON data ({<name>: <path>}, e.g.
+    # {'name': ('Section', 'name')}), extracted by the database. json_mapping
+    # then receives an object with these attributes (and pk).
+    mapping_fields = ()
+    mapping_paths = {}
 
     def json_mapping(self, obj) -> dict:
         raise NotImplemented
 
+    def get_projected_queryset(self, queryset):
+        """
+        Return the queryset as values of the mapping_fields and
+        mapping_paths, if these are declared.
+        """
+        if not (self.mapping_fields or self.mapping_paths) or \
+                not isinstance(queryset, QuerySet):
+            return queryset
+        fields = ['pk', *self.mapping_fields]
+        for field in self.keyset_ordering or ():
+            if field.lstrip('-') not in fields:
+                fields.append(field.lstrip('-'))
+        expressions = {
+            name: get_key_text_transform(path)
+            for name, path in self.mapping_paths.items()}
+        return queryset.annotate(**expressions).values(*fields, *expressions)
+
     def dispatch(self, request, *args, **kwargs):
         if not request.is_ajax():
             raise Http404
         return super().dispatch(request, *args, **kwargs)
 
     def get_object_list(self) -> list:
+        queryset = self.get_projected_queryset(self.get_queryset())
+        if self.paginate_by and self.keyset_ordering:
+            try:
+                objects, self.next_cursor = get_keyset_page(
+                    queryset, self.keyset_ordering,
+                    self.paginate_by, self.request.GET.get('after'))
+            except ValueError:
+                raise Http404
+            return objects
         if self.paginate_by:
-            return self.get_queryset()[: self.paginate_by]
+            return queryset[: self.paginate_by]
         else:
-            return self.get_queryset()
+            return queryset
 
     def get_json_data(self):
         for obj in self.get_object_list():
+            if isinstance(obj, dict):
+                # Projected values
+                obj = SimpleNamespace(**obj)
             yield self.json_mapping(obj)
 
     def get(self, request, *args, **kwargs):
-        return JsonResponse(list(self.get_json_data()), safe=False)
+        response = JsonResponse(list(self.get_json_data()), safe=False)
+        if self.next_cursor:
+            response['X-Next-Cursor'] = self.next_cursor
+        return response
 
 
 class AjaxSearchListView(AjaxSearchThroughMixin, View):
@@ -253,6 +408,12 @@ class AjaxSearchListView(AjaxSearchThroughMixin, View):
         """
         Use the model's search_lookup_paths to search in the JSON data of the
         model. Also search in PK if search term is an int.
+
+        If the model has a search_field (maintained on save with the
+        case-folded text of the search_lookup_paths), only this column is
+        searched, with a case-sensitive LIKE of the case-folded term: unlike
+        icontains (UPPER(...) LIKE UPPER(...)), this is served by a trigram
+        index (gin_trgm_ops) on the column on PostgreSQL.
         """
         queryset = super().get_queryset()
 
@@ -264,10 +425,19 @@ class AjaxSearchListView(AjaxSearchThroughMixin, View):
             raise Exception(
                 '"search_lookup_paths" need to be configured for the model')
 
-        q_objects = Q()
-        for path in lookup_paths:
-            key = '__'.join(('data',) + path + ('icontains',))
-            q_objects.add(Q(**{key: search_term}), Q.OR)
+        if is_searchable(self.model):
+            q_objects = Q(**{
+                f'{self.model.search_field}__contains': search_term.casefold()})
+        else:
+            structure = getattr(self.model._meta, 'structure', None)
+            q_objects = Q()
+            for path in lookup_paths:
+                if structure and len(path) == 2:
+                    # Search promoted JSON fields in their DB column
+                    key = f'{structure.get_lookup(*path)}__icontains'
+                else:
+                    key = '__'.join(('data',) + path + ('icontains',))
+                q_objects.add(Q(**{key: search_term}), Q.OR)
 
         try:
             pk = int(search_term)
@@ -282,12 +452,143 @@ class AjaxSearchDetailView(AjaxSearchThroughMixin, View):
     http_method_names = ['get']
     paginate_by = None
 
+    def get_data_version(self) -> str or None:
+        if not is_versioned(self.model):
+            return None
+        return get_object_version(self.model, self.kwargs['pk'])
+
+    def get_last_modified(self):
+        return get_object_last_modified(self.model, self.kwargs['pk'])
+
+    def get_queryset(self):
+        return super().get_queryset().filter(pk=self.kwargs['pk'])
+
+    def get_object_list(self) -> list:
+        objects = list(super().get_object_list())
+        if not objects:
+            raise Http404
+        return objects
+
+
+class AjaxSearchBatchMixin:
+    """
+    Return the json_mapping of many objects at once (?ids=1,2,3), e.g. to
+    show all linked objects of a form. The objects (or their projected
+    values) are fetched with a single query and returned in the order of the
+    IDs, unknown IDs are left out.
+    """
+    http_method_names = ['get']
+    paginate_by = None
+    max_ids = 1000
+
+    def get_ids(self) -> list:
+        try:
+            ids = [
+                int(pk) for pk in self.request.GET.get('ids', '').split(',')
+                if pk]
+        except ValueError:
+            raise Http404
+        if len(ids) > self.max_ids:
+            raise Http404
+        return ids
+
+    def get_data_version(self) -> str or None:
+        # Many objects (and no pk in the URL): use the version of the model.
+        return ModelVersionMixin.get_data_version(self)
+
+    def get_last_modified(self):
+        return ModelVersionMixin.get_last_modified(self)
+
     def get_queryset(self):
-        obj = get_object_or_404(self.model, pk=self.kwargs['pk'])
-        return [obj]
+        # Not the queryset of a detail view (filtered by the pk of the URL).
+        return MultipleObjectMixin.get_queryset(self).filter(
+            pk__in=self.get_ids())
+
+    def get_object_list(self) -> list:
+        # Not the object list of a detail view, which requires an object.
+        objects = {
+            obj['pk'] if isinstance(obj, dict) else obj.pk: obj
+            for obj in AjaxSearchThroughMixin.get_object_list(self)}
+        return [objects[pk] for pk in self.get_ids() if pk in objects]
+
+
+class AjaxSearchBatchView(AjaxSearchBatchMixin, AjaxSearchThroughMixin, View):
+    pass
+
+
+class SpatialFilterMixin:
+    """
+    Restrict the objects to an area, using the spatial lookups of the
+    database (which can use a spatial index).
+    """
+    # Name of the geometry field, defaults to the first geometry field of the
+    # model.
+    geometry_field = None
+
+    def get_geometry_field(self) -> GeometryField:
+        if self.geometry_field:
+            return self.model._meta.get_field(self.geometry_field)
+        for field in self.model._meta.get_fields():
+            if isinstance(field, GeometryField):
+                return field
+        raise Http404
+
+    def get_spatial_filter(self) -> GEOSGeometry or None:
+        """
+        Return the area the objects are restricted to: either a bounding
+        box (?bbox=<min x>,<min y>,<max x>,<max y>) or a polygon
+        (?polygon=<WKT or GeoJSON>), in WGS 84 unless the polygon specifies
+        its SRID (EWKT).
+        """
+        bbox = self.request.GET.get('bbox')
+        polygon = self.request.GET.get('polygon')
+        try:
+            if bbox:
+                geometry = Polygon.from_bbox(
+                    [float(value) for value in bbox.split(',')])
+            elif polygon:
+                geometry = GEOSGeometry(polygon)
+            else:
+                return None
+        except (ValueError, TypeError, GEOSException, GDALException):
+            raise Http404
+        if geometry.srid is None:
+            geometry.srid = 4326
+        return geometry
+
+    def filter_area(self, queryset):
+        spatial_filter = self.get_spatial_filter()
+        if spatial_filter:
+            queryset = queryset.filter(**{
+                f'{self.get_geometry_field().name}__intersects':
+                    spatial_filter})
+        return queryset
+
+    def get_wgs84_geometry(self):
+        """
+        Return the geometry field as expression in WGS 84 (longitude,
+        latitude).
+        """
+        geometry_field = self.get_geometry_field()
+        if geometry_field.srid != 4326:
+            return Transform(geometry_field.name, 4326)
+        return geometry_field.name
+
+
+class TopicsMixin:
+    """
+    Restrict the objects to the topics of the user's profile.
+    """
+    topics = []
 
+    def filter_topics(self, queryset):
+        self.topics = self.request.user.profile.topics
+        if self.topics and settings.CORE_ALL not in self.topics:
+            queryset = queryset.filter(topic__in=self.topics)
+        return queryset
 
-class ChartsView(TemplateView):
+
+class ChartsView(ModelVersionMixin, TopicsMixin, TemplateView):
 
     model = None
     template_name = 'flexiform/charts.html'
@@ -296,7 +597,6 @@ class ChartsView(TemplateView):
     question_keyword = ''
     question = None
 
-    topics = []
     chart_fields = {}
 
     def set_attributes(self):
@@ -356,13 +656,14 @@ class ChartsView(TemplateView):
         :return: A queryset, each entry containing two values: topic and
         extra_field
         """
-        queryset = self.model.objects
-
-        self.topics = self.request.user.profile.topics
-        if self.topics and settings.CORE_ALL not in self.topics:
-            queryset = queryset.filter(topic__in=self.topics)
-
-        if isinstance(self.question, JsonChoiceField):
+        queryset = self.filter_topics(self.model.objects)
+
+        promoted_column = self.model._meta.structure.get_promoted_fields().get(
+            (self.section_keyword, self.question_keyword))
+        if promoted_column:
+            # The JSON field is stored in a DB column as well
+            queryset = queryset.annotate(extra_field=F(promoted_column))
+        elif isinstance(self.question, JsonChoiceField):
             # Add JSON values to extra_field
             queryset = queryset.extra(select={
                 'extra_field':
@@ -411,12 +712,15 @@ class ChartsView(TemplateView):
 
         colors = dict(settings.CORE_TOPIC_COLORS)
 
+        # Promoted questions are aggregated from the typed model field.
+        keys = [self.model._meta.structure.get_promoted_code(
+            self.section_keyword, self.question_keyword, k) for k in choices]
+
         values = []
         for topic_key, topic_label in topics:
             values.append({
                 'label': topic_label,
-                'data': [data.get(topic_key, {}).get(k, 0) for k in
-                         choices.keys()],
+                'data': [data.get(topic_key, {}).get(k, 0) for k in keys],
                 'backgroundColor': colors[topic_key],
             })
 
@@ -438,6 +742,67 @@ class ChartsView(TemplateView):
         return context
 
 
+class ClustersView(ModelVersionMixin, TopicsMixin, SpatialFilterMixin, View):
+    """
+    Return the points of the model clustered on a grid, as GeoJSON
+    FeatureCollection with one point per cell: the centroid of the cell's
+    points along with their count. The clusters are computed by the database
+    (snap to grid).
+
+    The size of the cells (in degrees) is either set with ?grid=<size> or
+    derived from the zoom level of a web map (?zoom=<level>). The points can
+    be restricted to the visible area (?bbox=...) and are filtered by the
+    topics of the user, as in ChartsView.
+    """
+    model = None
+    # Number of cells along the edge of a map tile at the requested zoom
+    # level.
+    cells_per_tile = 8
+    max_zoom = 24
+
+    def get_grid_size(self) -> float:
+        try:
+            if 'grid' in self.request.GET:
+                grid_size = float(self.request.GET['grid'])
+            else:
+                zoom = min(int(self.request.GET.get('zoom', 0)), self.max_zoom)
+                grid_size = 360 / 2 ** max(zoom, 0) / self.cells_per_tile
+        except ValueError:
+            raise Http404
+        if not grid_size > 0:
+            raise Http404
+        return grid_size
+
+    def get_queryset(self) -> QuerySet:
+        queryset = self.filter_topics(self.model.objects.all())
+        return self.filter_area(queryset).filter(**{
+            f'{self.get_geometry_field().name}__isnull': False})
+
+    def get_clusters(self, grid_size: float) -> QuerySet:
+        """
+        Return the centroid and the number of points of each cell.
+        """
+        geometry = self.get_wgs84_geometry()
+        return self.get_queryset().annotate(
+            flexiform_cell=SnapToGrid(geometry, grid_size)
+        ).values('flexiform_cell').annotate(
+            count=Count('pk'), center=Centroid(Collect(geometry))
+        ).values_list('center', 'count')
+
+    def get(self, request, *args, **kwargs):
+        grid_size = self.get_grid_size()
+        features = [{
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [center.x, center.y]},
+            'properties': {'count': count},
+        } for center, count in self.get_clusters(grid_size)]
+        return JsonResponse({
+            'type': 'FeatureCollection',
+            'features': features,
+            'grid': grid_size,
+        })
+
+
 class NetworkGraphMixin:
     """
     Show a network graph. Links connected to a given object are queried, along
@@ -698,18 +1063,62 @@ class NetworkGraphMixin:
         return context
 
 
-class BaseFormViewMixin(RetrieveMixin, TemplateView):
+class BaseFormViewMixin(ConditionalResponseMixin, RetrieveMixin,
+                        TemplateView):
 
     # As multiple forms are rendered on a single page, it is necessary to
     # collect the unique media assets instead of letting each form render its
     # own (possibly duplicate) assets
     form_media = Media()
     steps = Mock()
+    # The routing object, fetched once per request by get_object.
+    routing_instance = None
+    # Keep the rendered readonly forms in the FLEXIFORM_CACHE, per object,
+    # data version, section and language.
+    cache_readonly_forms = False
 
     def get(self, request, *args, **kwargs):
         self.forms = self.get_readonly_forms()
         return super().get(request=request, *args, **kwargs)
 
+    def get_form_models(self) -> list:
+        models = []
+        for keyword, form in self.form_list:
+            if issubclass(form, BaseFlexiFormSet):
+                model = form.model
+            else:
+                model = getattr(getattr(form, 'Meta', None), 'model', None)
+            if model not in models:
+                models.append(model)
+        return models
+
+    def get_data_version(self) -> str or None:
+        """
+        The page shows the routing object and its related objects of the
+        other forms' models: combine the version of the object with the
+        versions of these models.
+        """
+        if 'pk' not in self.kwargs:
+            return None
+        routing_object = self.get_routing_object()
+        models = self.get_form_models()
+        if not all(is_versioned(model) for model in [routing_object] + models):
+            return None
+        return '-'.join(
+            [get_object_version(routing_object, self.kwargs['pk'])] + [
+                get_model_version(model) for model in models
+                if model is not routing_object])
+
+    def get_last_modified(self):
+        routing_object = self.get_routing_object()
+        timestamps = [
+            get_object_last_modified(routing_object, self.kwargs['pk'])] + [
+            get_model_last_modified(model) for model in self.get_form_models()
+            if model is not routing_object]
+        if None in timestamps:
+            return None
+        return max(timestamps)
+
     def get_context_data(self, **kwargs) -> dict:
         context = super().get_context_data(**kwargs)
         context.update({
@@ -718,6 +1127,62 @@ class BaseFormViewMixin(RetrieveMixin, TemplateView):
         })
         return context
 
+    def get_routing_queryset(self) -> QuerySet:
+        """
+        Return the queryset of the routing object, fetching all relations
+        which are read by the forms (fields of related models, links, through
+        objects and the objects of formsets) along with the object.
+        """
+        model = self.get_routing_object()
+        select_related = []
+        prefetch_related = []
+        for keyword, form in self.form_list:
+            if issubclass(form, BaseFlexiFormSet):
+                # See get_form_initial
+                try:
+                    rel_field = model._meta.get_field(
+                        form.model._meta.model_name)
+                except FieldDoesNotExist:
+                    continue
+                accessor = rel_field.get_accessor_name()
+                prefetch_related.append(accessor)
+                if hasattr(form.form, 'get_related_lookups'):
+                    for lookups in form.form.get_related_lookups():
+                        prefetch_related.extend(
+                            f'{accessor}__{lookup}' for lookup in lookups)
+            elif hasattr(form, 'get_related_lookups') and issubclass(
+                    getattr(form.Meta, 'model', type(None)), model):
+                form_select_related, form_prefetch_related = \
+                    form.get_related_lookups()
+                select_related.extend(form_select_related)
+                prefetch_related.extend(form_prefetch_related)
+
+        return model._default_manager.select_related(
+            *dict.fromkeys(select_related)
+        ).prefetch_related(*dict.fromkeys(prefetch_related))
+
+    def get_object(self, form):
+        """
+        Fetch the routing object once for all forms.
+        """
+        if 'pk' not in self.kwargs:
+            return None
+        if self.routing_instance is None:
+            self.routing_instance = get_object_or_404(
+                self.get_routing_queryset(), id=self.kwargs['pk'])
+        return self.routing_instance
+
+    def get_render_cache_key(self, keyword: str, data_version: str) -> str:
+        """
+        Return the cache key of the rendered readonly form. The output only
+        depends on the data of the object (and its related objects) and the
+        language. Saving the object changes its data version, and with it the
+        key.
+        """
+        return get_fragment_key([
+            self.get_routing_object()._meta.label_lower, self.kwargs['pk'],
+            data_version, keyword, translation.get_language()])
+
     def get_readonly_forms(self) -> list:
         """
         Return a list of tuples containing all readonly forms (populated with
@@ -727,6 +1192,10 @@ class BaseFormViewMixin(RetrieveMixin, TemplateView):
             and (2) the form itself.
         """
         ret = []
+        data_version = None
+        if self.cache_readonly_forms:
+            check_shared_cache('cache_readonly_forms')
+            data_version = self.get_data_version()
         for keyword, form in self.form_list:
             self.object = self.get_object(form=form)
             # Mock the 'current step' of the session wizard for the
@@ -739,6 +1208,10 @@ class BaseFormViewMixin(RetrieveMixin, TemplateView):
             else:
                 form_instance = form(prefix=keyword, initial=initial, readonly=True)
 
+            if data_version is not None:
+                form_instance.render_cache_key = self.get_render_cache_key(
+                    keyword, data_version)
+
             # Add form media
             self.form_media.add_js(form_instance.media._js)
             self.form_media.add_css(form_instance.media._css)
@@ -758,46 +1231,192 @@ class Echo:
         return value
 
 
-class DownloadCodesView(TemplateView):
+class CompressedDownloadMixin:
+    """
+    Compress the downloaded files, either as file (URLs ending with .csv.gz or
+    .csv.zst, passed as "extension") or, if compress_responses is set, as
+    content encoding accepted by the client (Accept-Encoding).
+    """
+    compress_responses = False
+    # Only these content types are compressed when negotiated with the client.
+    compressible_content_types = ('text/csv', 'application/geo+json')
+
+    file_compressions = {
+        'csv.gz': 'gzip',
+        'csv.zst': 'zstd',
+    }
+
+    def compress_export_file(self, export_file: ExportFile) -> ExportFile:
+        """
+        Return the file compressed if requested by the URL. Only the
+        compressible_content_types are compressed (e.g. not Parquet, which is
+        compressed already).
+        """
+        compression = self.file_compressions.get(self.kwargs.get('extension'))
+        if not compression:
+            return export_file
+        if export_file.content_type not in self.compressible_content_types:
+            raise Http404
+        if compression == 'zstd':
+            get_zstandard()
+
+        extension, content_type = COMPRESSIONS[compression]
+        return ExportFile(
+            chunks=iter_compressed(export_file.chunks, compression),
+            filename=f'{export_file.filename}{extension}',
+            content_type=content_type)
+
+    def get_accepted_encoding(self) -> str or None:
+        """
+        Return the compression accepted by the client (zstd is preferred if
+        available), None if responses are not compressed.
+        """
+        if not self.compress_responses:
+            return None
+
+        accepted = set()
+        for value in self.request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+            encoding, __, params = value.strip().partition(';')
+            if params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00'):
+                accepted.add(encoding.strip().lower())
+
+        if 'zstd' in accepted:
+            try:
+                get_zstandard()
+            except ImproperlyConfigured:
+                pass
+            else:
+                return 'zstd'
+        if 'gzip' in accepted:
+            return 'gzip'
+        return None
+
+    def get_content_encoding(self, export_file: ExportFile) -> str or None:
+        """
+        Return the compression of the response, None if the file is not to be
+        compressed.
+        """
+        if export_file.content_type not in self.compressible_content_types:
+            return None
+        return self.get_accepted_encoding()
+
+    def get_compression(self) -> tuple:
+        """
+        Return the compressions requested by the URL and by the client, the
+        content of the response depends on both (e.g. for ETags and cached
+        exports).
+        """
+        return (self.file_compressions.get(self.kwargs.get('extension')),
+                self.get_accepted_encoding())
+
+    def encode_export_file(self, export_file: ExportFile) -> tuple:
+        """
+        Return the file compressed with the content encoding of the response,
+        along with the encoding (None if not compressed).
+        """
+        content_encoding = self.get_content_encoding(export_file)
+        if content_encoding:
+            export_file = export_file._replace(
+                chunks=iter_compressed(export_file.chunks, content_encoding))
+        return export_file, content_encoding
+
+    def get_file_response(self, export_file: ExportFile,
+                          content_encoding: str=None) -> StreamingHttpResponse:
+        """
+        Return the file (compressed by encode_export_file) as attachment.
+        """
+        response = StreamingHttpResponse(
+            export_file.chunks, content_type=export_file.content_type)
+        response['Content-Disposition'] = \
+            f'attachment; filename="{export_file.filename}"'
+        if content_encoding:
+            response['Content-Encoding'] = content_encoding
+        if self.compress_responses:
+            patch_vary_headers(response, ('Accept-Encoding', ))
+        return response
+
+
+class DownloadCodesView(CompressedDownloadMixin, TemplateView):
     """
     A view to export the codes (the keywords of the choices) of selection
-    fields. Returns a CSV file.
+    fields. Returns a CSV file, or with ?format=json the labels of the codes
+    of each field (named like the properties of the structure, without the
+    index of repeating rows).
     """
     model = None
     paginate_by = None
     filename = 'export_codes.csv'
 
     def get(self, request, *args, **kwargs):
+        if request.GET.get('format') == 'json':
+            return JsonResponse(self.get_labels())
 
-        rows = [('Section', 'Question', 'Option', 'Code')]
-        rows.extend(self.get_rows())
+        rows = itertools.chain(
+            [('Section', 'Question', 'Option', 'Code')], self.get_rows())
 
         pseudo_buffer = Echo()
         writer = csv.writer(pseudo_buffer)
-        response = StreamingHttpResponse(
-            (writer.writerow(row) for row in rows), content_type='text/csv')
-        response[
-            'Content-Disposition'] = f'attachment; filename="{self.filename}"'
-        return response
+        export_file = ExportFile(
+            chunks=(writer.writerow(row).encode() for row in rows),
+            filename=self.filename, content_type='text/csv')
+        return self.get_file_response(
+            *self.encode_export_file(self.compress_export_file(export_file)))
 
     def get_rows(self):
-        structure = self.model._meta.structure
-        for __, form in structure.forms.items():
-            section_label = form.Meta.label
-            for __, field in form().fields.items():
-                if hasattr(field, '_choices'):
-                    for choice in field._choices:
-                        # Do not include empty (placeholder) options
-                        if not choice[0]:
-                            continue
-                        yield section_label, field.label, choice[1], choice[0]
-
+        for entry in self.model._meta.structure.get_codebook():
+            yield entry.section, entry.question, entry.option, entry.code
+
+    def get_labels(self) -> OrderedDict:
+        labels = OrderedDict()
+        delimiter = settings.FLEXIFORM_MODEL_JSON_PROPERTIES_DELIMITER
+        choice_labels = self.model._meta.structure.get_choice_labels()
+        for (keyword, name, row_key), choices in choice_labels.items():
+            if row_key is None:
+                labels[f'{keyword}{delimiter}{name}'] = choices
+            else:
+                labels[f'{keyword}_{name}_{row_key}'] = choices
+        return labels
 
 
-class DownloadMixin(ListView):
+class DownloadMixin(ModelVersionMixin, CompressedDownloadMixin,
+                    SpatialFilterMixin, ListView):
 
     model_fields = []
     filename = 'export.csv'
+    zip_filename = 'export.zip'
+    # Primary keys of the deleted objects, added to the ZIP of delta downloads.
+    deleted_filename = 'deleted.csv'
+    parquet_filename = 'export.parquet'
+    arrow_filename = 'export.arrow'
+    geojson_filename = 'export.geojson'
+    # Formats which can be requested with the "format" GET parameter.
+    export_formats = ('csv', 'zip', 'parquet', 'arrow', 'geojson')
+    # Number of objects fetched from the database at once.
+    chunk_size = 2000
+    # Extract the structure's properties with SQL expressions instead of
+    # reading them from the data in Python.
+    extract_in_database = False
+    # Keep generated exports as files and serve them again as long as the
+    # data of the model does not change. Set cache_per_user to False if the
+    # queryset is the same for all users.
+    cache_exports = False
+    cache_per_user = True
+    # Format CSV exports in this number of processes, each one writing the
+    # rows of shard_size objects (ordered by primary key) at a time.
+    export_processes = None
+    shard_size = 50000
+    # Delta downloads (?since=<cursor>) are set by get().
+    changes = None
+    # Labels of the codes of selection fields (?labels=replace or
+    # ?labels=append), in the language of the request. Set by get().
+    labels = None
+    label_language = None
+
+    def get_data_version(self) -> str or None:
+        if self.request.GET.get('background'):
+            # Each request starts a new export job
+            return None
+        return super().get_data_version()
 
     def set_model_fields(self):
         self.model_fields = []
@@ -852,112 +1471,883 @@ class DownloadMixin(ListView):
             return attr.wkt
         return attr
 
-    def from_structure(self, structure: JsonStructure) -> list:
+    def get_export_queryset(self):
+        """
+        Return the queryset restricted to the columns needed for the export:
+        the model fields and the "data" field.
+        """
+        queryset = self.get_download_queryset()
+        if not isinstance(queryset, QuerySet):
+            return queryset
+
+        fields = ['data']
+        for field_name in self.model_fields:
+            try:
+                queryset.model._meta.get_field(field_name)
+            except FieldDoesNotExist:
+                continue
+            fields.append(field_name)
+        return queryset.only(*fields)
+
+    def from_structure(self, structure: JsonStructure, definitions: list=None,
+                       queryset=None) -> list:
         """
         Return rows of data based on the properties as defined in the provided
         structure. Model fields are added at the beginning of each row. Only data
         rows are returned, without header.
+
+        :param definitions: list. Only export these properties, defaults to all
+            of the structure's property_definitions.
+        :param queryset: The objects to export, defaults to the export queryset.
         """
-        for obj in self.get_queryset():
+        if definitions is None:
+            definitions = structure.property_definitions
+        if queryset is None:
+            queryset = self.get_export_queryset()
+
+        if isinstance(queryset, QuerySet) and self.has_concrete_model_fields():
+            rows = self.from_structure_values(structure, queryset, definitions)
+        else:
+            rows = self.from_structure_objects(queryset, definitions)
+
+        label_columns = self.get_label_columns(structure, definitions)
+        if not label_columns:
+            yield from rows
+            return
+        offset = len(self.model_fields)
+        for row in rows:
+            yield self.add_labels(row, label_columns, offset, self.get_label)
+
+    def from_structure_objects(self, queryset, definitions: list):
+        for obj in self.get_iterator(queryset):
             row = []
             for field in self.model_fields:
                 row.append(self.get_attribute(obj, field))
-            for prop in structure.properties:
-                row.append(getattr(obj, prop))
+            for definition in definitions:
+                row.append(getattr(obj, definition.name))
             yield row
 
-    def from_data(self) -> list:
+    def set_labels(self):
+        self.labels = self.request.GET.get('labels') or None
+        if self.labels not in (None, 'replace', 'append'):
+            raise Http404
+        self.label_language = translation.get_language()
+
+    def get_label_columns(self, structure: JsonStructure,
+                          definitions: list) -> list:
         """
-        Return rows of data based on the data itself (as in the object's "data"
-        field). Model fields are added at the beginning of each row. The first
-        returned row serves as table header.
+        Return the properties of selection fields if labels are requested,
+        along with the labels of their codes.
+
+        :return: list. Tuples of (index of the definition, {code: label},
+            whether multiple codes are stored as comma-separated string).
+        """
+        if not self.labels:
+            return []
+        choice_labels = structure.get_choice_labels(self.label_language)
+        label_columns = []
+        for i, definition in enumerate(definitions):
+            labels = choice_labels.get(
+                (definition.keyword, definition.field_name, definition.row_key))
+            if labels is not None and definition.row_key is None:
+                # Promoted fields may be read from the typed model field.
+                labels = {
+                    **labels,
+                    **{structure.get_promoted_code(
+                        definition.keyword, definition.field_name, code): label
+                       for code, label in labels.items()}}
+            if labels is not None:
+                multiple = isinstance(
+                    structure.get_form_field(definition),
+                    MultipleChoiceField)
+                label_columns.append((i, labels, multiple))
+        return label_columns
+
+    def add_labels(self, values: list, label_columns: list, offset: int,
+                   get_label) -> list:
         """
-        obj_list = self.get_queryset()
+        Replace the values of the label columns with get_label(value, labels,
+        multiple), or insert it after the value if labels are appended.
+        Also used for the header and the value types of the columns.
+        """
+        values = list(values)
+        for i, labels, multiple in reversed(label_columns):
+            label = get_label(values[offset + i], labels, multiple)
+            if self.labels == 'append':
+                values.insert(offset + i + 1, label)
+            else:
+                values[offset + i] = label
+        return values
 
-        # First, collect all keys available in all objects along with their
-        # paths
-        key_paths = {}
-        for obj in obj_list:
+    @staticmethod
+    def get_label(value, labels: dict, multiple: bool):
+        """
+        Return the label of a code, or the labels of comma-separated codes.
+        Unknown codes are returned as they are.
+        """
+        if value in ('', None):
+            return value
+        if multiple and isinstance(value, str):
+            return ','.join(labels.get(code, code) for code in value.split(','))
+        return labels.get(value, labels.get(str(value), value))
+
+    def get_structure_header(self, structure: JsonStructure,
+                             definitions: list=None) -> list:
+        if definitions is None:
+            definitions = structure.property_definitions
+        header = self.model_fields + [d.name for d in definitions]
+        if self.labels != 'append':
+            return header
+        return self.add_labels(
+            header, self.get_label_columns(structure, definitions),
+            len(self.model_fields), lambda name, *args: f'{name}_label')
+
+    def get_structure_value_types(self, structure: JsonStructure) -> list:
+        value_types = \
+            self.get_model_field_types() + structure.get_property_types()
+        return self.add_labels(
+            value_types,
+            self.get_label_columns(structure, structure.property_definitions),
+            len(self.model_fields), lambda *args: STRING)
+
+    def has_concrete_model_fields(self) -> bool:
+        try:
+            for field_name in self.model_fields:
+                self.model._meta.get_field(field_name)
+        except FieldDoesNotExist:
+            return False
+        return True
+
+    def from_structure_values(
+            self, structure: JsonStructure, queryset, definitions: list):
+        """
+        Return the same rows as from_structure, but from the raw column values
+        (values_list) instead of model instances. The structure's properties
+        are either compiled into a single row extractor or, if
+        extract_in_database is set, extracted by the database.
+        """
+        if self.extract_in_database:
+            rows = (list(row) for row in self.get_iterator(
+                structure.values_list(
+                    queryset, *self.model_fields, definitions=definitions)))
+        else:
+            extract = structure.get_row_extractor(definitions)
+            values_list = queryset.values_list(*self.model_fields, 'data')
+            rows = (list(row[:-1]) + extract(row[-1])
+                    for row in self.get_iterator(values_list))
+
+        point_columns = [
+            i for i, field_name in enumerate(self.model_fields)
+            if getattr(self.model._meta.get_field(field_name),
+                       'geom_type', None) == 'POINT'
+        ]
+        for row in rows:
+            for i in point_columns:
+                if row[i] is not None:
+                    # For Points, return value as well known text
+                    row[i] = row[i].wkt
+            yield row
+
+    def iter_structure(self, structure: JsonStructure):
+        """
+        Yield the header and then the rows of the structure export, one at a
+        time.
+        """
+        yield self.get_structure_header(structure)
+        yield from self.from_structure(structure)
 
-            for section, section_data in obj.data.items():
+    def get_iterator(self, queryset):
+        """
+        Iterate over the queryset in chunks without caching the model
+        instances. Plain lists (e.g. mocked querysets) are iterated as they
+        are.
+        """
+        if isinstance(queryset, QuerySet):
+            return queryset.iterator(chunk_size=self.chunk_size)
+        return iter(queryset)
+
+    def get_data_iterator(self, queryset):
+        """
+        Iterate over the "data" field only, without loading the other columns.
+        """
+        if isinstance(queryset, QuerySet):
+            return self.get_iterator(queryset.values_list('data', flat=True))
+        return (obj.data for obj in queryset)
+
+    @staticmethod
+    def get_data_keys(data: dict):
+        """
+        Return all keys of a data dict along with their paths.
+        """
+        for section, section_data in data.items():
+            if not isinstance(section_data, dict):
+                # Already single question
+                yield section, [section]
+                continue
+
+            for question, question_data in section_data.items():
+                if isinstance(question_data, list):
+                    # Repeating group of questions, get all unique keys
+                    # within list of dicts
+                    keys = set()
+                    for question_dict in question_data:
+                        keys.update(question_dict.keys())
+
+                    for k in keys:
+                        yield f'{section}_{question}_{k}', [section, question, k]
+
+                else:
+                    yield f'{section}_{question}', [section, question]
+
+    def get_key_columns(self, queryset) -> OrderedDict:
+        """
+        First pass over the data: collect all keys available in all objects
+        along with their paths and the number of columns needed per key. Only
+        the paths and counters are kept in memory, not the values.
+
+        :return: OrderedDict. Sorted keys with (path, number of columns).
+        """
+        key_paths = {}
+        num_cols = {}
+        # Length of the longest list of repeating groups. Objects which do not
+        # have a key of the group still return one (empty) value per row.
+        group_lengths = {}
+        for data in self.get_data_iterator(queryset):
+            data = data or {}
+            for section, section_data in data.items():
                 if not isinstance(section_data, dict):
-                    # Already single question
-                    key = section
-                    key_paths[key] = [section]
                     continue
-
                 for question, question_data in section_data.items():
                     if isinstance(question_data, list):
-                        # Repeating group of questions, get all unique keys
-                        # within list of dicts
-                        keys = []
-                        for question_dict in question_data:
-                            keys.extend(question_dict.keys())
-                            keys = list(set(keys))
-
-                        for k in keys:
-                            key = f'{section}_{question}_{k}'
-                            key_paths[key] = [section, question, k]
-
-                    else:
-                        key = f'{section}_{question}'
-                        key_paths[key] = [section, question]
-
-        # Sort keys
-        key_paths = OrderedDict(sorted(key_paths.items()))
-
-        # Now get the values at the collected paths for each object
-        key_values = defaultdict(list)
-        for obj in obj_list:
-            for field in self.model_fields:
-                key_values[field].append([self.get_attribute(obj, field)])
-
-            for key, path in key_paths.items():
-                values = self.get_values_by_path(obj.data, path)
-                key_values[key].append(values)
-
-        # Put them together in a flat table
-        rows = defaultdict(list)
-        headers = []
-        for key, value_rows in key_values.items():
+                        group = (section, question)
+                        group_lengths[group] = max(
+                            group_lengths.get(group, 1), len(question_data))
+
+            for key, path in self.get_data_keys(data):
+                key_paths[key] = path
+                num_cols[key] = max(
+                    num_cols.get(key, 1),
+                    len(self.get_values_by_path(data, path)))
+
+        key_columns = OrderedDict()
+        for key, path in sorted(key_paths.items()):
+            key_columns[key] = path, max(
+                num_cols[key], group_lengths.get(tuple(path[:2]), 1))
+        return key_columns
+
+    def iter_data(self):
+        """
+        Yield rows of data based on the data itself (as in the object's "data"
+        field). Model fields are added at the beginning of each row. The first
+        yielded row serves as table header.
 
-            num_cols = len(max(value_rows, key=len))
+        The queryset is iterated twice: once to collect the keys and once to
+        generate the rows one at a time, so memory does not grow with the
+        number of objects.
+        """
+        key_columns = self.get_key_columns(self.get_download_queryset())
+        yield self.get_data_header(key_columns)
+        yield from self.from_key_columns(
+            key_columns, self.get_export_queryset())
+
+    def get_data_header(self, key_columns: OrderedDict) -> list:
+        headers = list(self.model_fields)
+        for key, (path, num_cols) in key_columns.items():
             if num_cols > 1:
-                for i in range(num_cols):
-                    headers.append(f'{key}_{i}')
+                headers.extend(f'{key}_{i}' for i in range(num_cols))
             else:
                 headers.append(key)
+        return headers
 
-            for obj_index, value_row in enumerate(value_rows):
-                values = [None] * num_cols
-                for i, v in enumerate(value_row):
-                    values[i] = v
-                rows[obj_index].extend(values)
+    def from_key_columns(self, key_columns: OrderedDict, queryset):
+        """
+        Second pass over the data: yield one row per object with the values
+        at the collected paths.
+        """
+        for obj in self.get_iterator(queryset):
+            row = [self.get_attribute(obj, field) for field in self.model_fields]
+            data = obj.data or {}
+            for path, num_cols in key_columns.values():
+                values = self.get_values_by_path(data, path)
+                row.extend(values)
+                row.extend([None] * (num_cols - len(values)))
+            yield row
 
-        return [headers] + list(rows.values())
+    def from_data(self) -> list:
+        """
+        Return rows of data based on the data itself (as in the object's "data"
+        field). Model fields are added at the beginning of each row. The first
+        returned row serves as table header.
 
-    def get(self, request, *args, **kwargs):
+        The downloads use iter_data, which does not keep all rows in memory.
+        """
+        return list(self.iter_data())
 
-        self.set_model_fields()
+    def iter_main_table(self, structure: JsonStructure):
+        """
+        Yield the header and the rows of the main table of the long layout:
+        the model fields and all properties which are not part of a repeating
+        field.
+        """
+        definitions = [
+            d for d in structure.property_definitions if d.index is None]
+        yield self.get_structure_header(structure, definitions)
+        yield from self.from_structure(structure, definitions)
 
-        if hasattr(self.model, '_meta') and hasattr(self.model._meta, 'structure'):
-            # structure available
-            structure = self.model._meta.structure
-            rows = list(itertools.chain(
-                [self.model_fields + structure.properties],
-                self.from_structure(structure)))
+    def iter_repeating_table(self, keyword: str, field):
+        """
+        Yield the header and the rows of the table of a repeating field in the
+        long layout: one row per repeating row, along with the ID of the
+        object and the index of the row.
+        """
+        header = ['parent_id', 'index'] + list(field.row.keys())
+        label_columns = []
+        if self.labels:
+            label_columns = self.get_label_columns(self.get_structure(), [
+                StructureProperty(
+                    name=key, keyword=keyword, field_name=field.name,
+                    field=field, row_key=key, index=0)
+                for key in field.row.keys()])
+            header = self.add_labels(
+                header, label_columns, 2,
+                lambda name, *args: f'{name}_label'
+                if self.labels == 'append' else name)
+        yield header
+
+        queryset = self.get_download_queryset()
+        if isinstance(queryset, QuerySet):
+            values = self.get_iterator(queryset.values_list('pk', 'data'))
         else:
-            # No structure available
-            rows = self.from_data()
-            
+            values = ((obj.pk, obj.data) for obj in queryset)
+
+        for pk, data in values:
+            rows = (data or {}).get(keyword, {}).get(field.name) or []
+            for i, row in enumerate(rows):
+                yield self.add_labels(
+                    [pk, i] + [row.get(key) for key in field.row.keys()],
+                    label_columns, 2, self.get_label)
+
+    @staticmethod
+    def iter_csv(rows):
+        """
+        Yield each row formatted as a line of CSV.
+        """
         pseudo_buffer = Echo()
         writer = csv.writer(pseudo_buffer)
-        response = StreamingHttpResponse(
-            (writer.writerow(row) for row in rows), content_type='text/csv')
-        response[
-            'Content-Disposition'] = f'attachment; filename="{self.filename}"'
+        for row in rows:
+            yield writer.writerow(row)
+
+    def iter_zip(self, structure: JsonStructure):
+        """
+        Yield the bytes of a ZIP archive containing the long layout of the
+        export: a main table (named as filename) and one table per repeating
+        field (named <keyword>_<field name>.csv).
+        """
+        zip_stream = ZipStream()
+        yield from zip_stream.write_file(
+            self.filename,
+            (line.encode() for line in self.iter_csv(
+                self.iter_main_table(structure))))
+        for keyword, field in structure.get_repeating_fields():
+            yield from zip_stream.write_file(
+                f'{keyword}_{field.name}.csv',
+                (line.encode() for line in self.iter_csv(
+                    self.iter_repeating_table(keyword, field))))
+        if self.changes:
+            yield from zip_stream.write_file(
+                self.deleted_filename,
+                (line.encode() for line in self.iter_csv(
+                    [[self.model._meta.pk.attname]] +
+                    [[pk] for pk in self.changes.deleted])))
+        yield from zip_stream.close()
+
+    def get_model_field_types(self) -> list:
+        value_types = []
+        for field_name in self.model_fields:
+            try:
+                field = self.model._meta.get_field(field_name)
+            except FieldDoesNotExist:
+                value_types.append(STRING)
+            else:
+                value_types.append(get_model_field_type(field))
+        return value_types
+
+    def iter_columnar(self, file_format: str):
+        """
+        Yield the bytes of the export in a columnar format (Parquet or Arrow).
+        Properties of a structure keep the type of their form field, values
+        without a structure are exported as strings.
+        """
+        structure = self.get_structure()
+        if structure:
+            header = self.get_structure_header(structure)
+            value_types = self.get_structure_value_types(structure)
+            rows = self.from_structure(structure)
+        else:
+            value_types = self.get_model_field_types()
+            rows = self.iter_data()
+            header = next(rows)
+            value_types.extend(
+                [STRING] * (len(header) - len(self.model_fields)))
+
+        yield from iter_columnar(
+            header=header, value_types=value_types, rows=rows,
+            file_format=file_format, batch_size=self.chunk_size)
+
+    @staticmethod
+    def get_pk_ranges(pks, shard_size: int) -> list:
+        """
+        Split ordered primary keys into ranges of shard_size objects.
+
+        :return: list. Tuples of (first pk, first pk of the next range), the
+            last range is open (None).
+        """
+        first_pks = [pk for i, pk in enumerate(pks) if i % shard_size == 0]
+        return list(zip(first_pks, first_pks[1:] + [None]))
+
+    def iter_sharded_csv(self):
+        """
+        Yield the CSV export as bytes, formatted in the shard pool. The
+        objects are split into ranges of primary keys, each process writes the
+        rows of one range to a file with its own database connection. The
+        files are then returned in order.
+
+        The processes do not read the structure's properties from the data,
+        they export the columns of the header written here (see
+        JsonStructure.get_definition_keys).
+        """
+        structure = self.get_structure()
+        queryset = self.get_export_queryset().order_by('pk')
+        if structure:
+            key_columns = None
+            definition_keys = structure.get_definition_keys(
+                structure.property_definitions)
+            header = self.get_structure_header(structure)
+        else:
+            key_columns = self.get_key_columns(queryset)
+            definition_keys = None
+            header = self.get_data_header(key_columns)
+        yield next(self.iter_csv([header])).encode()
+
+        pk_ranges = self.get_pk_ranges(
+            self.get_iterator(queryset.values_list('pk', flat=True)),
+            self.shard_size)
+
+        directory = os.path.join(
+            settings.FLEXIFORM_EXPORT_ROOT, 'shards', uuid.uuid4().hex)
+        os.makedirs(directory)
+        executor = shard_pool.get_executor(self.export_processes)
+        futures = [
+            executor.submit(
+                export_shard, type(self), self.model_fields, queryset.query,
+                pk_range, key_columns, definition_keys,
+                os.path.join(directory, f'{i}.csv'), self.labels,
+                self.label_language)
+            for i, pk_range in enumerate(pk_ranges)
+        ]
+        try:
+            for future in futures:
+                path = future.result()
+                with open(path, 'rb') as f:
+                    yield from iter(lambda: f.read(64 * 1024), b'')
+                os.remove(path)
+        finally:
+            for future in futures:
+                future.cancel()
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def can_shard_export(self) -> bool:
+        """
+        Sharded exports need a queryset and, with a structure, the values of
+        the model fields (the processes do not set the structure's properties
+        on the model).
+        """
+        if not self.export_processes or not isinstance(
+                self.get_download_queryset(), QuerySet):
+            return False
+        return not self.get_structure() or self.has_concrete_model_fields()
+
+    def get_download_queryset(self):
+        """
+        Return the objects to download: the queryset, restricted to the
+        objects changed since the cursor for delta downloads.
+        """
+        queryset = self.get_queryset()
+        if self.changes:
+            queryset = queryset.filter(pk__in=self.changes.changed)
+        return queryset
+
+    def set_changes(self):
+        """
+        Set the changes for delta downloads (?since=<cursor>), which are only
+        available in the ZIP format, along with the deleted objects.
+        """
+        since = self.request.GET.get('since')
+        if since is None:
+            return
+        if not is_tracked(self.model) or not since.isdigit() or \
+                self.get_export_format() != 'zip':
+            raise Http404
+        self.changes = get_changes(self.model, since=int(since))
+
+    def iter_geojson(self):
+        """
+        Yield the bytes of a GeoJSON FeatureCollection, one feature per
+        object. The objects are filtered by the spatial filter and the
+        geometries serialized by the database (in WGS 84). The model fields
+        and the structure's properties are the properties of the features.
+        """
+        queryset = self.filter_area(self.get_download_queryset())
+        geometry_field = self.get_geometry_field()
+        geometry = self.get_wgs84_geometry()
+
+        field_names = []
+        for field_name in self.model_fields:
+            try:
+                field = self.model._meta.get_field(field_name)
+            except FieldDoesNotExist:
+                continue
+            if field != geometry_field:
+                field_names.append(field_name)
+
+        structure = self.get_structure()
+        if structure:
+            header = field_names + self.get_structure_header(structure)[
+                len(self.model_fields):]
+            extract_values = structure.get_row_extractor()
+            label_columns = self.get_label_columns(
+                structure, structure.property_definitions)
+
+            def extract(data):
+                return self.add_labels(
+                    extract_values(data), label_columns, 0, self.get_label)
+        else:
+            header = field_names + ['data']
+
+            def extract(data):
+                return [data]
+
+        values_list = queryset.annotate(
+            flexiform_geojson=AsGeoJSON(geometry)
+        ).values_list('pk', 'flexiform_geojson', *field_names, 'data')
+
+        yield b'{"type": "FeatureCollection", "features": ['
+        separator = ''
+        for row in self.get_iterator(values_list):
+            values = [
+                value.wkt if isinstance(value, GEOSGeometry) else value
+                for value in row[2:-1]
+            ] + extract(row[-1])
+            # The geometry is already serialized by the database.
+            feature = '{"type": "Feature", "id": %s, "geometry": %s, ' \
+                      '"properties": %s}' % (
+                          json.dumps(row[0], cls=DjangoJSONEncoder),
+                          row[1] or 'null',
+                          json.dumps(dict(zip(header, values)),
+                                     cls=DjangoJSONEncoder))
+            yield f'{separator}{feature}'.encode()
+            separator = ','
+        yield b']}'
+
+    def get_structure(self) -> JsonStructure or None:
+        if hasattr(self.model, '_meta') and hasattr(self.model._meta, 'structure'):
+            return self.model._meta.structure
+        return None
+
+    def get_export_format(self) -> str:
+        """
+        Return the format requested by the "format" GET parameter, e.g.
+        ?format=zip for the long layout.
+        """
+        export_format = self.request.GET.get('format', 'csv')
+        if export_format not in self.export_formats:
+            raise Http404
+        return export_format
+
+    def get(self, request, *args, **kwargs):
+
+        self.set_model_fields()
+        self.set_changes()
+        self.set_labels()
+
+        # The cursor is taken before the data is read: changes during the
+        # download are part of the next delta.
+        cursor = None
+        if self.changes:
+            cursor = self.changes.cursor
+        elif is_tracked(self.model):
+            cursor = get_cursor(self.model)
+
+        export_file = self.compress_export_file(self.get_export_file())
+        if request.GET.get('background'):
+            response = self.get_job_response(export_file)
+            return self.set_cursor(response, cursor)
+
+        # Cached exports are stored with the content encoding of the response.
+        export_file, content_encoding = self.encode_export_file(export_file)
+        if self.cache_exports:
+            cached_export = CachedExport(
+                key_parts=self.get_cache_key_parts(),
+                version=get_model_version(self.model),
+                filename=export_file.filename)
+            if cached_export.exists():
+                response = get_ranged_file_response(
+                    request, path=cached_export.path,
+                    filename=export_file.filename,
+                    content_type=export_file.content_type)
+                if content_encoding and response.status_code != 416:
+                    response['Content-Encoding'] = content_encoding
+                return self.set_cursor(response, cursor)
+            export_file = export_file._replace(
+                chunks=cached_export.write(export_file.chunks))
+
+        return self.set_cursor(
+            self.get_file_response(export_file, content_encoding), cursor)
+
+    def dispatch(self, request, *args, **kwargs):
+        response = super().dispatch(request, *args, **kwargs)
+        if self.compress_responses:
+            # Also for responses which are not compressed (e.g. 304)
+            patch_vary_headers(response, ('Accept-Encoding', ))
         return response
 
+    def get_etag_key_parts(self) -> list:
+        return super().get_etag_key_parts() + [self.get_compression()]
+
+    @staticmethod
+    def set_cursor(response, cursor: int or None):
+        """
+        Return the cursor of tracked models with the download, to request
+        the next delta with ?since=<cursor>.
+        """
+        if cursor is not None:
+            response['X-Flexiform-Cursor'] = str(cursor)
+        return response
+
+    def get_cache_key_parts(self) -> list:
+        """
+        Return what identifies the export besides the data version: the model,
+        the GET parameters (format and filters), the user, as the queryset
+        may depend on the user, and the compression.
+        """
+        return [
+            self.model._meta.label_lower,
+            sorted(self.request.GET.lists()),
+            self.request.user.pk if self.cache_per_user else None,
+            self.get_compression(),
+            self.label_language if self.labels else None,
+        ]
+
+    def get_export_file(self) -> ExportFile:
+        return getattr(self, f'get_{self.get_export_format()}_export')()
+
+    def get_job_response(self, export_file: ExportFile) -> JsonResponse:
+        """
+        Run the export in the background instead (?background=1). Returns the
+        URL where the status of the export job can be polled.
+        """
+        job = export_jobs.enqueue(
+            chunks=export_file.chunks, filename=export_file.filename,
+            content_type=export_file.content_type,
+            owner=self.request.user.pk)
+        status_url = reverse(
+            f'{self.model.__name__.lower()}:download_job',
+            kwargs={'job_id': job.id})
+        return JsonResponse(
+            {'id': job.id, 'status': job.get_status()['status'],
+             'status_url': status_url},
+            status=202)
+
+    def get_csv_export(self) -> ExportFile:
+        if self.can_shard_export():
+            return ExportFile(
+                chunks=self.iter_sharded_csv(), filename=self.filename,
+                content_type='text/csv')
+
+        structure = self.get_structure()
+        if structure:
+            rows = self.iter_structure(structure)
+        else:
+            # No structure available
+            rows = self.iter_data()
+
+        return ExportFile(
+            chunks=(line.encode() for line in self.iter_csv(rows)),
+            filename=self.filename, content_type='text/csv')
+
+    def get_parquet_export(self) -> ExportFile:
+        get_pyarrow()
+        return ExportFile(
+            chunks=self.iter_columnar('parquet'),
+            filename=self.parquet_filename,
+            content_type='application/vnd.apache.parquet')
+
+    def get_arrow_export(self) -> ExportFile:
+        get_pyarrow()
+        return ExportFile(
+            chunks=self.iter_columnar('arrow'), filename=self.arrow_filename,
+            content_type='application/vnd.apache.arrow.stream')
+
+    def get_geojson_export(self) -> ExportFile:
+        if not isinstance(self.get_download_queryset(), QuerySet):
+            raise Http404
+        self.get_geometry_field()
+        return ExportFile(
+            chunks=self.iter_geojson(), filename=self.geojson_filename,
+            content_type='application/geo+json')
+
+    def get_zip_export(self) -> ExportFile:
+        """
+        Return the long layout, which is only available for models with a
+        structure.
+        """
+        structure = self.get_structure()
+        if not structure:
+            raise Http404
+
+        return ExportFile(
+            chunks=self.iter_zip(structure), filename=self.zip_filename,
+            content_type='application/zip')
+
+
+def export_shard(view_class, model_fields: list, query, pk_range: tuple,
+                 key_columns: OrderedDict or None, definition_keys: list or None,
+                 path: str, labels: str=None, label_language: str=None) -> str:
+    """
+    Write the CSV rows of the objects within a range of primary keys to a
+    file. This runs in a process of the shard pool (see
+    DownloadMixin.iter_sharded_csv), the columns are the definition_keys of
+    the structure or the key_columns of the requesting process.
+    """
+    view = view_class()
+    view.model_fields = model_fields
+    view.labels = labels
+    view.label_language = label_language
+    queryset = view.model._default_manager.all()
+    queryset.query = query
+    first_pk, next_pk = pk_range
+    queryset = queryset.filter(pk__gte=first_pk)
+    if next_pk is not None:
+        queryset = queryset.filter(pk__lt=next_pk)
+
+    structure = view.get_structure()
+    if definition_keys is not None:
+        rows = view.from_structure(
+            structure, definitions=structure.get_definitions(definition_keys),
+            queryset=queryset)
+    else:
+        rows = view.from_key_columns(key_columns, queryset)
+
+    try:
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            csv.writer(f).writerows(rows)
+    finally:
+        connections.close_all()
+    return path
+
+
+def get_ranged_file_response(request, path: str, filename: str,
+                             content_type: str, block_size: int=64 * 1024):
+    """
+    Return a file as attachment, supporting a single byte range (Range
+    header) so interrupted downloads can be resumed.
+    """
+    size = os.path.getsize(path)
+    start, end = 0, size - 1
+    status = 200
+
+    range_header = request.META.get('HTTP_RANGE', '')
+    match = re.match(r'^bytes=(\d*)-(\d*)$', range_header.strip())
+    if match and any(match.groups()):
+        first, last = match.groups()
+        if first:
+            start = int(first)
+            if last:
+                end = min(int(last), size - 1)
+        else:
+            # Suffix range: the last bytes of the file
+            start = max(size - int(last), 0)
+        if start > end or start >= size:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        status = 206
+
+    def read_file():
+        with open(path, 'rb') as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                block = f.read(min(block_size, remaining))
+                if not block:
+                    break
+                remaining -= len(block)
+                yield block
+
+    response = StreamingHttpResponse(
+        read_file(), status=status, content_type=content_type)
+    response['Content-Length'] = str(end - start + 1)
+    response['Accept-Ranges'] = 'bytes'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    if status == 206:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
+class ExportJobMixin:
+    """
+    Retrieve the background export job of the URL. Jobs are only available to
+    the user who started them.
+    """
+
+    def get_job(self) -> ExportJob:
+        job = ExportJob(self.kwargs['job_id'])
+        status = job.get_status()
+        if status is None or status['owner'] != self.request.user.pk:
+            raise Http404
+        return job
+
+
+class ExportJobStatusView(ExportJobMixin, View):
+    """
+    Return the status of a background export as JSON, along with the URL of
+    the file once the export is done.
+    """
+    http_method_names = ['get']
+
+    def get(self, request, *args, **kwargs):
+        job = self.get_job()
+        status = job.get_status()
+        data = {
+            'id': job.id,
+            'status': status['status'],
+            'filename': status['filename'],
+            'size': status['size'],
+            'error': status['error'],
+        }
+        if status['status'] == DONE:
+            namespace = request.resolver_match.namespace
+            data['file_url'] = reverse(
+                f'{namespace}:download_job_file', kwargs={'job_id': job.id})
+        return JsonResponse(data)
+
+
+class ExportJobFileView(ExportJobMixin, View):
+    """
+    Return the file of a finished background export, with support for
+    resuming the download (Range requests).
+    """
+    http_method_names = ['get']
+
+    def get(self, request, *args, **kwargs):
+        job = self.get_job()
+        status = job.get_status()
+        if status['status'] != DONE:
+            raise Http404
+        return get_ranged_file_response(
+            request, path=job.file_path, filename=status['filename'],
+            content_type=status['content_type'])
+
 
 class PaginationMixin:
     """
@@ -967,8 +2357,17 @@ class PaginationMixin:
 
     Use together with template "core/snippets/pagination.html" (to be included
     in the list template)
+
+    Set estimate_count to use the row estimate of the database for large
+    tables instead of COUNT(*) (see EstimatedCountPaginator).
     """
     adjacent_pages = 3
+    estimate_count = False
+
+    def get_paginator(self, *args, **kwargs):
+        if self.estimate_count:
+            return EstimatedCountPaginator(*args, **kwargs)
+        return super().get_paginator(*args, **kwargs)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -991,11 +2390,40 @@ class PaginationMixin:
             'page_numbers': page_numbers,
             'show_first': 1 not in page_numbers,
             'show_last': num_pages not in page_numbers,
+            'count_is_estimated': getattr(
+                context.get('paginator'), 'is_estimated', False),
         })
 
         return context
 
 
+class KeysetPaginationMixin:
+    """
+    Paginate a list by the position after the last object of the previous
+    page (?after=<cursor>) instead of a page number: each page is fetched
+    with the same cost, without COUNT(*) or OFFSET. Only links to the first
+    and the next page are possible (next_cursor in the context).
+
+    keyset_ordering must be unique, e.g. end with the primary key, and only
+    contain fields of the model.
+    """
+    keyset_ordering = ('-pk', )
+
+    def paginate_queryset(self, queryset, page_size):
+        try:
+            objects, self.next_cursor = get_keyset_page(
+                queryset, self.keyset_ordering, page_size,
+                self.request.GET.get('after'))
+        except ValueError:
+            raise Http404
+        return None, None, objects, False
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['next_cursor'] = getattr(self, 'next_cursor', None)
+        return context
+
+
 class BaseDeleteMixin:
     template_name = 'flexiform/crud/object_confirm_delete.html'
 